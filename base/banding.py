@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# -------------------------
+# Rating bands
+# -------------------------
+# Every banded rating factor is defined once here: its bin edges and the
+# rating guide labels, in canonical order. Values are mapped to bands with a
+# single np.searchsorted over the precomputed edges, matching
+# pd.cut(right=True, include_lowest=True).
+
+class Band:
+    def __init__(self, edges, labels):
+        self.edges = np.asarray(edges, dtype=float)
+        self.labels = list(labels)
+
+    def codes(self, values):
+        """Band index per value (intervals closed on the right, lowest edge included), -1 if out of range / null."""
+        x = pd.to_numeric(pd.Series(values, copy=False), errors="coerce").to_numpy(dtype=float)
+        ids = np.searchsorted(self.edges, x, side="left")
+        ids[x == self.edges[0]] = 1
+        ids[np.isnan(x) | (ids == 0) | (ids == len(self.edges))] = 0
+        return ids - 1
+
+    def cut(self, values):
+        """Band a column into an ordered Categorical of labels (drop-in for pd.cut)."""
+        index = values.index if isinstance(values, pd.Series) else None
+        return pd.Series(
+            pd.Categorical.from_codes(self.codes(values), categories=self.labels, ordered=True),
+            index=index,
+        )
+
+    def label(self, value):
+        """Band label for a single value, '' if blank or out of range."""
+        if value in (None, ""):
+            return ""
+        code = self.codes([value])[0]
+        return self.labels[code] if code >= 0 else ""
+
+
+# Policyholder Age (Years)
+PH_AGE = Band(
+    [0, 19.999, 29.999, 39.999, 49.999, 59.999, 69.999, 79.999, 89.999, float("inf")],
+    ['0 - 19.999','20 - 29.999','30 - 39.999','40 - 49.999','50 - 59.999','60 - 69.999','70 - 79.999','80 - 89.999','90 and over'],
+)
+
+# Pet Age in Months
+PET_AGE = Band(
+    [
+        0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23,24,28,31,
+        34,37,40,43,46,48,54,60,66,72,78,84,90,96,102,108,114,120,126,132,138,
+        144,150,156,162,168,174,180,186,192,204,216,228,240,float("inf")
+    ],
+    ['0','1','2','3','4','5','6','7','8','9','10','11','12','13','14','15','16',
+     '17','18','19','20','21','22','23','24–28','29–31','32–34','35–37','38–40',
+     '41–43','44–46','47–48','49–54','55–60','61–66','67–72','73–78','79–84',
+     '85–90','91–96','97–102','103–108','109–114','115–120','121–126','127–132',
+     '133–138','139–144','145–150','151–156','157–162','163–168','169–174','175–180',
+     '181–186','187–192','193–204','205–216','217–228','229–240','241+'],
+)
+
+# Pet Age (Months) band used with gender
+PET_AGE_GENDER = Band([0, 50, 100, float("inf")], ["1–50", "51–100", "101+"])
+
+# Cost of Pet
+PET_PRICE = Band(
+    [0, 75, 150, 300, 600, 1200, float("inf")],
+    ['£0–£75','£76–£150','£151–£300','£301–£600','£601–£1,200','£1,201+'],
+)
+
+GENDERS = ["female", "male"]
+
+ph_age_order = PH_AGE.labels
+pet_age_order = PET_AGE.labels
+pet_price_order = PET_PRICE.labels
+pet_age_gender_order = [f"{gender}: {band}" for gender in GENDERS for band in PET_AGE_GENDER.labels]
+
+# Rating factor -> {option: position}, for sorting factor options into guide order
+FACTOR_ORDERS = {
+    factor: {label: i for i, label in enumerate(order)}
+    for factor, order in [
+        ("ph_age", ph_age_order),
+        ("pet_age", pet_age_order),
+        ("pet_price", pet_price_order),
+        ("pet_age_gender", pet_age_gender_order),
+    ]
+}
+
+
+def sort_options(factor, options):
+    """
+    Factor options in rating guide order. Unbanded factors sort alphabetically;
+    labels missing from a band order go last, in their original order.
+    """
+    order = FACTOR_ORDERS.get(factor)
+    if order is None:
+        return sorted(options)
+    return sorted(options, key=lambda option: order.get(option, len(order)))
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import threading
+from .rate_table import get_rate_table
+from .banding import sort_options
+
+# -------------------------
+# Factor grids
+# -------------------------
+# One rating factor pivoted to option x (pet type, scheme), for the factor pages:
+#   {"factor": ..., "columns": [{"pet_type", "scheme", "limit"}, ...],
+#    "options": [...], "rates": [[rate per column] per option],
+#    "nested": {pet_type: {scheme: {"limit": ..., factor: rate | {option: rate}}}}}
+# Single-value factors (base_rate) have options [None] and one row of rates.
+# For templates the grid is also pre-flattened: "pet_types" [(pet_type, column
+# count)], "rows" [(option, rates)] and "by_option" {option: rates}, with 0 for
+# a missing rate as the pages have always shown; "version" is a hash of the
+# grid's contents, so rendered fragments can be cached per factor and version.
+# Built from the compiled rate table and kept per rate set until it is rebuilt.
+_FACTOR_GRID_STATE = {}  # {rate set: (rate table, {factor: grid})}
+_FACTOR_GRID_LOCK = threading.Lock()
+
+
+def build_factor_grid(table, factor):
+    """Pivot one factor out of a compiled rate table. Options are in rating guide order (see sort_options)."""
+    nested = {}
+    options = {}  # dict as ordered set
+    for (pet_type, scheme), entry in table.items():
+        if factor not in entry["factors"]:
+            continue
+        rates = entry["factors"][factor]
+        nested.setdefault(pet_type, {})[scheme] = {"limit": entry["limit"], factor: rates}
+        if isinstance(rates, dict):
+            options.update(dict.fromkeys(rates))
+
+    columns = [
+        {"pet_type": pet_type, "scheme": scheme, "limit": scheme_rates["limit"]}
+        for pet_type, schemes in nested.items()
+        for scheme, scheme_rates in schemes.items()
+    ]
+    cells = [nested[column["pet_type"]][column["scheme"]][factor] for column in columns]
+
+    if options:
+        options = sort_options(factor, options)
+        rates = [
+            [cell.get(option) if isinstance(cell, dict) else None for cell in cells]
+            for option in options
+        ]
+    else:
+        options = [None]
+        rates = [cells]
+
+    rows = [
+        (option, [0 if rate is None else rate for rate in option_rates])
+        for option, option_rates in zip(options, rates)
+    ]
+    version = hashlib.sha1(json.dumps([columns, options, rates]).encode("utf-8")).hexdigest()
+
+    return {
+        "factor": factor,
+        "version": version,
+        "columns": columns,
+        "options": options,
+        "rates": rates,
+        "nested": nested,
+        "pet_types": [(pet_type, len(schemes)) for pet_type, schemes in nested.items()],
+        "rows": rows,
+        "by_option": dict(rows),
+    }
+
+
+def get_factor_grid(factor, rate_set=None):
+    """Return the grid for a factor from the current compiled rate table of a rate set (None = working rates)."""
+    global _FACTOR_GRID_STATE
+
+    table = get_rate_table(rate_set)
+    cached_table, grids = _FACTOR_GRID_STATE.get(rate_set, (None, {}))
+    if cached_table is table and factor in grids:
+        return grids[factor]
+
+    with _FACTOR_GRID_LOCK:
+        cached_table, grids = _FACTOR_GRID_STATE.get(rate_set, (None, {}))
+        if cached_table is not table:
+            grids = {}
+        if factor not in grids:
+            grids = {**grids, factor: build_factor_grid(table, factor)}
+            _FACTOR_GRID_STATE = {**_FACTOR_GRID_STATE, rate_set: (table, grids)}
+
+    return grids[factor]
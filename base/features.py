@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from .banding import PH_AGE, PET_AGE, PET_AGE_GENDER, PET_PRICE
+
+# -------------------------
+# Rating feature derivation
+# -------------------------
+# Column-wise versions of the per-row date maths and labels used to build the
+# rating factors, shared by the policy re-rate (static_data.re_rated_cache) and
+# the quote check (static_data.quote_data).
+
+def to_datetime(col):
+    """Parse a column to datetime64 once (no-op if it already is one)."""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col
+    return pd.to_datetime(col, format="mixed")
+
+
+def year_month(col):
+    """
+    (year, month) columns of a date column: int64, or float64 with NaN for
+    missing dates (so ages derived from them are NaN and fall outside every band).
+    """
+    dates = to_datetime(col).dt
+    year, month = dates.year, dates.month
+    if year.isna().any():
+        return year.astype("float64"), month.astype("float64")
+    return year.astype("int64"), month.astype("int64")
+
+
+def add_policy_period(df, date_col="effective_date"):
+    """Add yoa and inception_month (YYYY.MM as a float, e.g. 2025.07) from a date column."""
+    year, month = year_month(df[date_col])
+    df["yoa"] = year
+    df["inception_month"] = year + month / 100
+    return df
+
+
+def age_in_years(as_at, dob):
+    """Calendar-year difference, as used for policyholder age."""
+    return year_month(as_at)[0] - year_month(dob)[0]
+
+
+def age_in_months(as_at, dob):
+    """Whole calendar months between dob and as_at, as used for pet age."""
+    as_at_year, as_at_month = year_month(as_at)
+    dob_year, dob_month = year_month(dob)
+    return (as_at_year - dob_year) * 12 + (as_at_month - dob_month)
+
+
+def crossbreed_breed(breed, size):
+    """Crossbreeds and mongrels are rated by size: 'crossbreed: small'."""
+    is_cross = breed.str.lower().isin(["crossbreed", "mongrel"])
+    sized = breed + ": " + size.str.split().str[0]
+    return breed.where(~is_cross, sized).str.lower()
+
+
+def quote_breed(pet_type, pet_sub_type, breed, size):
+    """
+    Breed label for quote data: moggies and cats by sub type / breed, dog
+    crossbreeds and mongrels (by sub type or breed name) by size.
+    """
+    def lower_str(col):
+        # str() every value (None -> 'none', NaN -> 'nan') like the old per-row version
+        return pd.Series(np.asarray(col, dtype=str), index=col.index, dtype=object).str.lower()
+
+    pet_type = lower_str(pet_type)
+    pet_sub_type = lower_str(pet_sub_type)
+    breed = lower_str(breed)
+    size = lower_str(size)
+
+    return pd.Series(np.select(
+        [
+            pet_sub_type == "moggie",
+            pet_type == "cat",
+            pet_sub_type.isin(["crossbreed", "mongrel"]),
+            breed.str.contains("mongrel", regex=False),
+            breed.str.contains("crossbreed", regex=False),
+        ],
+        [
+            pet_sub_type,
+            breed,
+            pet_sub_type + ": " + size,
+            "mongrel: " + size,
+            "crossbreed: " + size,
+        ],
+        default=breed,
+    ), index=breed.index)
+
+
+def add_banded_features(df, ph_age, pet_age_mnths, gender, cost_of_pet):
+    """
+    Band the raw ages and price into the rating guide's options and add them to df:
+    ph_age, pet_age_mnths (1–50 / 51–100 / 101+), pet_age, pet_age_gender, pet_price.
+    """
+    df["ph_age"] = PH_AGE.cut(ph_age)
+    df["pet_age_mnths"] = PET_AGE_GENDER.cut(pet_age_mnths)
+    df["pet_age"] = PET_AGE.cut(pet_age_mnths)
+    df["pet_age_gender"] = (
+        gender.astype(str) + ": " + df["pet_age_mnths"].astype(str)
+    ).str.lower()
+    df["pet_price"] = PET_PRICE.cut(cost_of_pet)
+    return df
@@ -1,5 +1,6 @@
 from django import forms
-from base import static_data  # your module that loads RE_RATED_CACHE
+from base import static_data
+from base.report_engine import read_re_rated
 
 class UserForms(forms.Form):
     copay_choices = [
@@ -23,20 +24,13 @@ class UserForms(forms.Form):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
-        # Load dataframe from your cache
-        static_data.load_re_rated_cache()
-        df_merged = static_data.RE_RATED_CACHE
-
-        # Get unique inception months (as strings, like '2025.07')
-        months = (
-            df_merged['inception_month']
-            .dropna()
-            .astype(float)
-            .unique()
-        )
-
-        # Sort chronologically (works with YYYY.MM format)
-        months = sorted(months)
+        # Distinct inception months come from the dataset's sidecar metadata
+        meta = static_data.read_re_rated_meta()
+        if meta is not None:
+            months = meta["months"]
+        else:
+            # Built before the sidecar existed: read just the inception_month column
+            months = sorted(read_re_rated(["inception_month"])["inception_month"].dropna().astype(float).unique())
 
         # Assign dropdown choices (value, label)
         self.fields['asat_date'].choices = [(m, m) for m in months]
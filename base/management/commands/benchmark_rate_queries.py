@@ -0,0 +1,106 @@
+import sqlite3
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+from base.models import PetRates
+
+# Indexes added for the factor and pet type / scheme lookups (0003_petrates_indexes)
+RATE_INDEXES = [index.name for index in PetRates._meta.indexes]
+
+# PetRates as created by 0001_initial, before rate sets and the rate indexes
+ORIGINAL_SCHEMA = [
+    'CREATE TABLE "base_petrates" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, '
+    '"pet_type" varchar(10) NOT NULL, "scheme" varchar(50) NOT NULL, "factor" varchar(50) NOT NULL, '
+    '"option" varchar(50) NULL, "rate" real NOT NULL, "limit" real NULL)',
+    'CREATE UNIQUE INDEX "base_petrates_pet_type_scheme_factor_option_cb508ed3_uniq" '
+    'ON "base_petrates" ("pet_type", "scheme", "factor", "option")',
+]
+ORIGINAL_COLUMNS = ("id", "pet_type", "scheme", "factor", "option", "rate", "limit")
+
+LOOKUP_COLUMNS = ("factor", "option", "rate", "limit")
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the query plan and latency of the hot PetRates lookups on the original "
+        "schema and queries and on the current ones, using in-memory copies of the rates database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=200, help="Times each query is run (default 200).")
+        parser.add_argument("--factor", default="postcode", help="Factor for the factor grid query.")
+        parser.add_argument("--pet-type", default="dog", help="Pet type for the pet type / scheme query.")
+        parser.add_argument("--scheme", default="gold", help="Scheme for the pet type / scheme query.")
+
+    def handle(self, *args, **options):
+        db = router.db_for_read(PetRates)
+        connection = connections[db]
+        if connection.vendor != "sqlite":
+            raise CommandError("The benchmark copies the SQLite rates database; it is not SQLite here.")
+
+        # Work on in-memory copies so the real database is never touched
+        current = sqlite3.connect(":memory:")
+        source = sqlite3.connect(connection.settings_dict["NAME"])
+        source.backup(current)
+        source.close()
+
+        found = {name for (name,) in current.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        missing = sorted(set(RATE_INDEXES) - found)
+        if missing:
+            raise CommandError(f"Rate indexes missing ({', '.join(missing)}) — run migrate --database={db} first.")
+
+        # Before: the working rates in the table as 0001_initial created it
+        original = sqlite3.connect(":memory:")
+        for sql in ORIGINAL_SCHEMA:
+            original.execute(sql)
+        columns = ", ".join(f'"{col}"' for col in ORIGINAL_COLUMNS)
+        original.executemany(
+            f"INSERT INTO base_petrates ({columns}) VALUES ({', '.join('?' * len(ORIGINAL_COLUMNS))})",
+            current.execute(f"SELECT {columns} FROM base_petrates WHERE rate_set_id IS NULL"),
+        )
+
+        factor, pet_type, scheme = options["factor"], options["pet_type"], options["scheme"]
+        cases = [
+            # (name, query before, query after)
+            (
+                f"factor grid ({factor})",
+                PetRates.objects.filter(factor=factor).values_list(*ORIGINAL_COLUMNS),
+                PetRates.objects.filter(rate_set=None, factor=factor).values_list(*ORIGINAL_COLUMNS),
+            ),
+            (
+                f"pet type / scheme ({pet_type}, {scheme})",
+                PetRates.objects
+                .filter(pet_type__iexact=pet_type, scheme__iexact=scheme)
+                .values_list(*LOOKUP_COLUMNS),
+                PetRates.objects
+                .filter(rate_set=None, pet_type=pet_type.lower(), scheme=scheme.lower())
+                .values_list(*LOOKUP_COLUMNS),
+            ),
+        ]
+
+        # Before: original schema, factor-only and case-insensitive queries.
+        # After: current schema (rate sets, rate indexes), exact matching on the normalised keys.
+        before = [self.measure(original, query, db, options["repeat"]) for _, query, _ in cases]
+        after = [self.measure(current, query, db, options["repeat"]) for _, _, query in cases]
+
+        for (name, _, _), old, new in zip(cases, before, after):
+            self.stdout.write(f"🔍 {name}: {old['rows']} / {new['rows']} rows")
+            for label, result in [("before", old), ("after", new)]:
+                self.stdout.write(f"   {label:<7}{result['ms']:8.3f} ms   {' / '.join(result['plan'])}")
+
+        original.close()
+        current.close()
+
+    def measure(self, copy, query, db, repeat):
+        """Query plan, mean latency (ms) and row count of an ORM query run on the copy."""
+        sql, params = query.query.get_compiler(using=db).as_sql()
+        sql = sql % (("?",) * len(params))
+
+        plan = [row[-1] for row in copy.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        repeat = max(repeat, 1)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            rows = copy.execute(sql, params).fetchall()
+        elapsed = time.perf_counter() - start
+
+        return {"plan": plan, "ms": elapsed / repeat * 1000, "rows": len(rows)}
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(max_length=50, unique=True)),
+                ('effective_date', models.DateField(db_index=True)),
+                ('source', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['effective_date'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='petrates',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='petrates',
+            name='rate_set',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rates', to='base.rateset'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='petrates',
+            unique_together={('rate_set', 'pet_type', 'scheme', 'factor', 'option')},
+        ),
+        migrations.AddConstraint(
+            model_name='petrates',
+            constraint=models.UniqueConstraint(condition=models.Q(('rate_set__isnull', True)), fields=('pet_type', 'scheme', 'factor', 'option'), name='petrates_working_rates_unique'),
+        ),
+    ]
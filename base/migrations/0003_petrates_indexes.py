@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:54
+
+from django.db import migrations, models
+
+
+def normalize_rate_keys(apps, schema_editor):
+    """
+    Store pet_type / scheme the way lookups normalise them ('dog', 'premier_plus'),
+    so they can use the indexes with exact matches. Where two rows normalise to
+    the same key the newest is kept, as in the compiled rate table.
+    """
+    PetRates = apps.get_model('base', 'PetRates')
+    db = schema_editor.connection.alias
+
+    seen = set()
+    to_delete, to_fix = [], []
+    rows = PetRates.objects.using(db).order_by('-id').values_list(
+        'id', 'rate_set_id', 'pet_type', 'scheme', 'factor', 'option'
+    )
+    for pk, rate_set_id, pet_type, scheme, factor, option in rows.iterator():
+        normalized = (pet_type.strip().lower(), scheme.strip().lower().replace(' ', '_'))
+        key = (rate_set_id, *normalized, factor, option)
+        if key in seen:
+            to_delete.append(pk)
+            continue
+        seen.add(key)
+        if normalized != (pet_type, scheme):
+            to_fix.append((pk, *normalized))
+
+    PetRates.objects.using(db).filter(pk__in=to_delete).delete()
+    for pk, pet_type, scheme in to_fix:
+        PetRates.objects.using(db).filter(pk=pk).update(pet_type=pet_type, scheme=scheme)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0002_rate_sets'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_rate_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='petrates',
+            index=models.Index(fields=['factor', 'rate_set', 'pet_type', 'scheme'], name='petrates_factor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='petrates',
+            index=models.Index(fields=['rate_set', 'pet_type', 'scheme', 'factor', 'option', 'rate', 'limit'], name='petrates_pet_scheme_idx'),
+        ),
+    ]
@@ -128,12 +128,29 @@ class SchemeQuoteResultComment(models.Model):
         db_table = 'SchemeQuoteResultComment'
 
 
+class RateSet(models.Model):
+    """A published version of the rating guide, in force from effective_date."""
+    version = models.CharField(max_length=50, unique=True)  # e.g., 'v40'
+    effective_date = models.DateField(db_index=True)
+    source = models.CharField(max_length=255, blank=True)  # rating guide file name
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['effective_date']
+
+    def __str__(self):
+        return f"{self.version} (from {self.effective_date})"
+
+
 class PetRates(models.Model):
     PET_CHOICES = [
         ('cat', 'Cat'),
         ('dog', 'Dog'),
     ]
 
+    # Rate set the row belongs to; NULL rows are the working rates loaded by all_rates()
+    rate_set = models.ForeignKey(RateSet, null=True, blank=True, on_delete=models.CASCADE, related_name='rates')
+
     pet_type = models.CharField(max_length=10, choices=PET_CHOICES)
     scheme = models.CharField(max_length=50)  # e.g., Bronze, Silver
     factor = models.CharField(max_length=50)  # e.g., 'base_rate', 'copay', 'postcode', 'breed'
@@ -142,7 +159,24 @@ class PetRates(models.Model):
     limit = models.FloatField(null=True, blank=True)  # e.g., 2250
 
     class Meta:
-        unique_together = ('pet_type', 'scheme', 'factor', 'option')
+        unique_together = ('rate_set', 'pet_type', 'scheme', 'factor', 'option')
+        constraints = [
+            # NULLs are distinct in the key above, so the working rates need their own
+            models.UniqueConstraint(
+                fields=['pet_type', 'scheme', 'factor', 'option'],
+                condition=models.Q(rate_set__isnull=True),
+                name='petrates_working_rates_unique',
+            ),
+        ]
+        indexes = [
+            # Factor grids: every row of one factor
+            models.Index(fields=['factor', 'rate_set', 'pet_type', 'scheme'], name='petrates_factor_idx'),
+            # Pet type / scheme lookups, covering the columns they read (keys are stored lower-case)
+            models.Index(
+                fields=['rate_set', 'pet_type', 'scheme', 'factor', 'option', 'rate', 'limit'],
+                name='petrates_pet_scheme_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.pet_type} | {self.scheme} | {self.factor} | {self.option} = {self.rate}"
\ No newline at end of file
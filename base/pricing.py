@@ -0,0 +1,138 @@
+import numpy as np
+from .rate_table import get_scheme_rates, normalize_key
+from .banding import PH_AGE, PET_AGE, PET_AGE_GENDER, PET_PRICE
+
+# -------------------------
+# Premium formula
+# -------------------------
+# Multiplicative factors applied to base_rate, in rating guide order.
+# This list is the single source of truth for the premium calculation: the
+# quote endpoint and the re-rating pipeline (via PREMIUM_FORMULA) both use it.
+RATING_FACTORS = [
+    "pet_age", "pet_age_gender", "breed", "pet_price", "neutered_gender", "chipped",
+    "vaccinations", "pre_existing", "aggressive", "is_pet_yours", "postcode",
+    "uk_resident", "kept_at_address", "trade_business", "ph_age", "copay", "multipet",
+]
+
+# DataFrame.eval expression over base_rate and the <factor>_factor columns
+PREMIUM_FORMULA = " * ".join(["base_rate"] + [f"{factor}_factor" for factor in RATING_FACTORS])
+
+# Rate used in the rating guide to mark a declined risk
+DECLINE_RATE = 999
+
+# Quote request fields that map straight onto a yes/no (or banded) factor option
+QUOTE_FIELDS = [
+    "pet_price", "chipped", "vaccinations", "pre_existing", "aggressive", "is_pet_yours",
+    "postcode", "uk_resident", "kept_at_address", "trade_business", "ph_age", "copay", "multipet",
+]
+
+
+# Band label fields that can instead be given as a raw value: field -> (raw field, band)
+RAW_BANDED_FIELDS = {
+    "ph_age": ("ph_age_years", PH_AGE),
+    "pet_price": ("cost_of_pet", PET_PRICE),
+}
+
+
+def factor_table_name(factor, pet_type):
+    """Breed rates are stored per pet type ('dog_breed' / 'cat_breed')."""
+    if factor == "breed":
+        return f"{pet_type}_breed"
+    return factor
+
+
+def normalize_option(value):
+    """
+    Lower-case and collapse whitespace to match the option labels in PetRates.
+    Booleans (e.g. JSON true / false) are the guide's yes / no.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, (bool, np.bool_)):
+        return "yes" if value else "no"
+    return " ".join(str(value).split()).lower()
+
+
+def normalize_age_band(value):
+    """The rating guide uses en dashes in pet age bands ('1–50'); the calculator sends hyphens."""
+    return normalize_option(value).replace("-", "\u2013")
+
+
+def risk_options(params):
+    """
+    Turn raw premium calculator fields into {factor: option} using the
+    same option labels as the re-rating pipeline. Pet age, policyholder age and
+    purchase price can be sent as band labels (pet_age1 / pet_age2, ph_age,
+    pet_price) or raw values (pet_age_months, ph_age_years, cost_of_pet).
+    Blank answers are left out.
+    """
+    gender = normalize_option(params.get("pet_gender"))
+    pet_age_months = params.get("pet_age_months")
+    options = {
+        "pet_age": normalize_age_band(params.get("pet_age2")) or PET_AGE.label(pet_age_months),
+        "breed": normalize_option(params.get("breed")),
+    }
+
+    if gender:
+        age_band = normalize_age_band(params.get("pet_age1")) or PET_AGE_GENDER.label(pet_age_months)
+        neutered = normalize_option(params.get("neutered"))
+        if age_band:
+            options["pet_age_gender"] = f"{gender}: {age_band}"
+        if neutered:
+            options["neutered_gender"] = f"{gender}: {neutered}"
+
+    for field in QUOTE_FIELDS:
+        options[field] = normalize_option(params.get(field))
+
+    # Raw values can be sent instead of a band label
+    for field, (raw_field, band) in RAW_BANDED_FIELDS.items():
+        options[field] = options[field] or band.label(params.get(raw_field))
+
+    return {factor: option for factor, option in options.items() if option}
+
+
+def quote_premium(pet_type, scheme, options):
+    """
+    Price one risk against the compiled rate table.
+    options is {factor: option} as returned by risk_options().
+    Returns None when the pet type / scheme has no rates, otherwise a dict with
+    the premium, the per-factor breakdown, the decline flag and any factors
+    that could not be rated (missing answer or unknown option). The premium is
+    None until every factor is rated, as PREMIUM_FORMULA gives no premium then.
+    """
+    scheme_rates = get_scheme_rates(pet_type, scheme)
+    if not scheme_rates:
+        return None
+
+    pet_type, scheme = normalize_key(pet_type, scheme)
+    table = scheme_rates["factors"]
+
+    premium = table.get("base_rate", 0)
+    breakdown = {}
+    missing = []
+
+    for factor in RATING_FACTORS:
+        option = options.get(factor)
+        rate = table.get(factor_table_name(factor, pet_type), {}).get(option) if option else None
+
+        # Breeds that cannot be matched to the rating guide are declined
+        if rate is None and factor == "breed" and option:
+            rate = DECLINE_RATE
+
+        if rate is None:
+            missing.append(factor)
+            continue
+
+        breakdown[factor] = rate
+        premium *= rate
+
+    return {
+        "pet_type": pet_type,
+        "scheme": scheme,
+        "limit": scheme_rates["limit"],
+        "base_rate": table.get("base_rate", 0),
+        "factors": breakdown,
+        "premium": None if missing else premium,
+        "decline_flag": "Y" if DECLINE_RATE in breakdown.values() else "N",
+        "missing": missing,
+    }
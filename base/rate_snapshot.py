@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import struct
+from datetime import datetime, timezone
+import numpy as np
+from .models import PetRates
+
+# -------------------------
+# Binary rate snapshot
+# -------------------------
+# The PetRates rows as one compact binary file, so a process can load the
+# rating guide without Excel or the rates database:
+#   MAGIC | version (uint32) | header length (uint32) | header JSON | arrays
+# The header holds the string tables (pet types, schemes, factors, options),
+# where each array sits in the file, and a SHA-256 of the string tables and
+# arrays. Arrays are 8-byte aligned and read straight from a memory map, with
+# no parsing. Each process still compiles its own rate table from them (see
+# rate_table.build_rate_table); the file is a loading format, not shared memory.
+SNAPSHOT_MAGIC = b"PETRATES"
+SNAPSHOT_VERSION = 1
+
+# Row columns stored as codes into a string table (-1 = None)
+STRING_COLUMNS = ["pet_type", "scheme", "factor", "option"]
+NUMERIC_COLUMNS = ["rate", "limit"]
+
+_PREFIX = struct.Struct("<8sII")
+
+
+def _pad(length, align=8):
+    return -length % align
+
+
+def _checksum(strings, body):
+    digest = hashlib.sha256(json.dumps(strings, sort_keys=True).encode("utf-8"))
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def write_rate_snapshot(path, rows=None, source=None):
+    """
+    Write PetRates rows (pet_type, scheme, factor, option, rate, limit tuples,
+    by default the working rates in id order) as a snapshot. The file is
+    written to a temporary name and swapped in, so readers never see a
+    partial snapshot.
+    """
+    if rows is None:
+        rows = PetRates.objects.filter(rate_set=None).order_by("id").values_list(
+            "pet_type", "scheme", "factor", "option", "rate", "limit"
+        )
+    rows = list(rows)
+
+    strings, arrays = {}, {}
+    for i, name in enumerate(STRING_COLUMNS):
+        values = [row[i] for row in rows]
+        table = sorted({value for value in values if value is not None})
+        index = {value: code for code, value in enumerate(table)}
+        strings[name] = table
+        arrays[name] = np.array([index.get(value, -1) for value in values], dtype=np.int32)
+    for i, name in enumerate(NUMERIC_COLUMNS, start=len(STRING_COLUMNS)):
+        arrays[name] = np.array([np.nan if row[i] is None else row[i] for row in rows], dtype=np.float64)
+
+    # Lay the arrays out back to back, each 8-byte aligned
+    body = bytearray()
+    layout = {}
+    for name, array in arrays.items():
+        body += b"\0" * _pad(len(body))
+        layout[name] = {"dtype": array.dtype.str, "offset": len(body), "length": len(array)}
+        body += array.tobytes()
+
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "source": source,
+        "rows": len(rows),
+        "strings": strings,
+        "arrays": layout,
+        "sha256": _checksum(strings, bytes(body)),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * _pad(_PREFIX.size + len(header_bytes))
+
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(body)
+    os.replace(tmp_path, path)
+
+    print(f"✅ Wrote rate snapshot ({len(rows)} rates) to {path}")
+    return header
+
+
+def read_rate_snapshot(path, verify=True):
+    """
+    Memory-map a snapshot and return its header plus {column: array}.
+    Raises ValueError if the file is not a snapshot, has an unsupported
+    version, or (with verify) fails its checksum.
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    if len(buffer) < _PREFIX.size:
+        raise ValueError(f"Not a rate snapshot: {path}")
+
+    magic, version, header_length = _PREFIX.unpack_from(buffer, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"Not a rate snapshot: {path}")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported rate snapshot version {version} (expected {SNAPSHOT_VERSION})")
+
+    body_start = _PREFIX.size + header_length
+    header = json.loads(bytes(buffer[_PREFIX.size:body_start]))
+    body = buffer[body_start:]
+    if verify and _checksum(header["strings"], body) != header["sha256"]:
+        raise ValueError(f"Rate snapshot checksum mismatch: {path}")
+
+    arrays = {
+        name: np.frombuffer(body, dtype=entry["dtype"], count=entry["length"], offset=entry["offset"])
+        for name, entry in header["arrays"].items()
+    }
+    return header, arrays
+
+
+def snapshot_rows(header, arrays):
+    """Yield the snapshot back as (pet_type, scheme, factor, option, rate, limit) rows."""
+    columns = []
+    for name in STRING_COLUMNS:
+        table = header["strings"][name] + [None]  # code -1 -> None
+        columns.append([table[code] for code in arrays[name].tolist()])
+    columns.append(arrays["rate"].tolist())
+    columns.append([None if limit != limit else limit for limit in arrays["limit"].tolist()])  # NaN -> None
+    return zip(*columns)
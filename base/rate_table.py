@@ -0,0 +1,221 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .models import PetRates, RateSet
+from .rate_snapshot import read_rate_snapshot, snapshot_rows
+from .banding import sort_options
+
+# -------------------------
+# Compiled rating table
+# -------------------------
+# (pet_type, scheme) -> {"limit": float, "factors": {factor: rate | {option: rate}}}
+# Built once per process from PetRates and swapped in whole when the rates
+# database changes, so a lookup is only ever dict reads.
+# With settings.RATE_SNAPSHOT set, the table is built from that binary snapshot
+# (see rate_snapshot.py) instead and rebuilt when the snapshot file changes.
+# One table is kept per rate set: None for the working rates, otherwise a
+# RateSet id (a published guide version, see RateSet).
+_RATE_TABLE_STATE = (None, {})  # (database stamp, {rate set: table})
+_RATE_TABLE_LOCK = threading.Lock()
+
+
+def normalize_key(pet_type, scheme):
+    """Normalise a pet type / scheme pair to the keys used in PetRates (e.g. 'dog', 'premier_plus')."""
+    return (
+        str(pet_type or "").strip().lower(),
+        str(scheme or "").strip().lower().replace(" ", "_"),
+    )
+
+
+def rate_snapshot_path():
+    """The snapshot rates are loaded from (settings.RATE_SNAPSHOT), or None to use the rates database."""
+    return getattr(settings, "RATE_SNAPSHOT", None)
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except (TypeError, OSError):
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _rates_db_stamp():
+    """
+    Cheap change marker for the rates: (mtime, size) of the SQLite file and of
+    the snapshot if one is configured (None for anything not a file on disk).
+    """
+    return (
+        _file_stamp(settings.DATABASES.get("rates", {}).get("NAME")),
+        _file_stamp(rate_snapshot_path()),
+    )
+
+
+def build_rate_table(rate_set=None):
+    """
+    Read every PetRates row of a rate set once (the working rates come from the
+    snapshot if configured) and compile it into the nested lookup dict.
+    """
+    table = {}
+    snapshot = rate_snapshot_path()
+    if snapshot and rate_set is None:
+        rows = snapshot_rows(*read_rate_snapshot(snapshot))
+    else:
+        rows = (
+            PetRates.objects
+            .filter(rate_set=rate_set)
+            .order_by("id")
+            .values_list("pet_type", "scheme", "factor", "option", "rate", "limit")
+            .iterator()
+        )
+
+    for pet_type, scheme, factor, option, rate, limit in rows:
+        entry = table.setdefault(normalize_key(pet_type, scheme), {"limit": limit, "factors": {}})
+
+        # Handle options (e.g. yes/no) vs single values
+        if option:
+            entry["factors"].setdefault(factor, {})[option] = rate
+        else:
+            entry["factors"][factor] = rate
+
+    return table
+
+
+def get_rate_table(rate_set=None):
+    """
+    Return the compiled rate table for a rate set (None = working rates),
+    rebuilding it only when the rates database has changed.
+    The new table is built off to the side and swapped in with a single assignment.
+    """
+    global _RATE_TABLE_STATE
+
+    stamp = _rates_db_stamp()
+    cached_stamp, tables = _RATE_TABLE_STATE
+    if cached_stamp == stamp and rate_set in tables:
+        return tables[rate_set]
+
+    with _RATE_TABLE_LOCK:
+        cached_stamp, tables = _RATE_TABLE_STATE
+        if cached_stamp != stamp:
+            tables = {}
+        if rate_set not in tables:
+            table = build_rate_table(rate_set)
+            tables = {**tables, rate_set: table}
+            _RATE_TABLE_STATE = (stamp, tables)
+            print(f"✅ Compiled rate table{'' if rate_set is None else f' for rate set {rate_set}'}: {len(table)} pet type / scheme combinations")
+
+    return tables[rate_set]
+
+
+def invalidate_rate_table():
+    """Drop the compiled tables so the next lookup rebuilds them (call after writing PetRates)."""
+    global _RATE_TABLE_STATE
+
+    with _RATE_TABLE_LOCK:
+        _RATE_TABLE_STATE = (None, {})
+
+
+def get_scheme_rates(pet_type, scheme, rate_set=None):
+    """
+    Return {"limit": ..., "factors": {...}} for one pet type / scheme, or None if unrated.
+    """
+    return get_rate_table(rate_set).get(normalize_key(pet_type, scheme))
+
+
+# -------------------------
+# Premium calculator options
+# -------------------------
+# The prem_calc dropdowns, built from the compiled table instead of one
+# DISTINCT query per list, and rebuilt only when the table is.
+_OPTION_LISTS_STATE = {}  # {rate set: (rate table, option lists)}
+_OPTION_LISTS_LOCK = threading.Lock()
+
+# Factors whose options feed a dropdown
+OPTION_FACTORS = ["pet_age", "pet_price", "ph_age", "dog_breed", "cat_breed", "postcode"]
+
+
+def build_option_lists(table):
+    """
+    Every premium calculator dropdown from one pass over a compiled rate table.
+    Pet types, schemes, breeds and postcodes keep rating guide order; banded
+    factors are in band order.
+    """
+    # Dicts as ordered sets
+    pet_types, schemes = {}, {}
+    options = {factor: {} for factor in OPTION_FACTORS}
+
+    for (pet_type, scheme), entry in table.items():
+        pet_types.setdefault(pet_type)
+        schemes.setdefault(scheme)
+        for factor, seen in options.items():
+            rates = entry["factors"].get(factor)
+            if isinstance(rates, dict):
+                seen.update(dict.fromkeys(rates))
+
+    return {
+        "pet_types": list(pet_types),
+        "cover_levels": list(schemes),
+        "pet_age_options": sort_options("pet_age", options["pet_age"]),
+        "pet_price_options": sort_options("pet_price", options["pet_price"]),
+        "ph_age_options": sort_options("ph_age", options["ph_age"]),
+        "dog_breeds": list(options["dog_breed"]),
+        "cat_breeds": list(options["cat_breed"]),
+        "postcodes": list(options["postcode"]),
+    }
+
+
+def get_option_lists(rate_set=None):
+    """Return the prem_calc option lists for the current compiled rate table of a rate set."""
+    global _OPTION_LISTS_STATE
+
+    table = get_rate_table(rate_set)
+    cached_table, option_lists = _OPTION_LISTS_STATE.get(rate_set, (None, None))
+    if cached_table is table:
+        return option_lists
+
+    with _OPTION_LISTS_LOCK:
+        cached_table, option_lists = _OPTION_LISTS_STATE.get(rate_set, (None, None))
+        if cached_table is not table:
+            option_lists = build_option_lists(table)
+            _OPTION_LISTS_STATE = {**_OPTION_LISTS_STATE, rate_set: (table, option_lists)}
+
+    return option_lists
+
+
+# -------------------------
+# Rate sets in force
+# -------------------------
+def rate_set_on(date):
+    """
+    Id of the rate set in force on date (the latest effective on or before it),
+    or None before the first one. A single read of the effective_date index.
+    """
+    return (
+        RateSet.objects
+        .filter(effective_date__lte=date)
+        .order_by("-effective_date", "-id")
+        .values_list("id", flat=True)
+        .first()
+    )
+
+
+def rate_sets_in_force(dates):
+    """
+    rate_set_on() for a whole column of dates in one query: an object array
+    of RateSet ids, None where no rate set was in force yet.
+    """
+    schedule = list(RateSet.objects.order_by("effective_date", "id").values_list("effective_date", "id"))
+    ids = np.array([None] + [rate_set_id for _, rate_set_id in schedule], dtype=object)
+
+    dates = pd.to_datetime(pd.Series(dates, copy=False))
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    starts = np.array([np.datetime64(start, "ns") for start, _ in schedule], dtype="datetime64[ns]")
+
+    # Position after the last start on or before each date (0 = before the first);
+    # NaT sorts after every date, so blank dates are sent to None explicitly
+    found = np.searchsorted(starts, dates.to_numpy(dtype="datetime64[ns]"), side="right")
+    found[dates.isna().to_numpy()] = 0
+    return ids[found]
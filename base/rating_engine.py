@@ -0,0 +1,297 @@
+import threading
+import numpy as np
+import pandas as pd
+from .rate_table import get_rate_table
+from .pricing import (
+    RATING_FACTORS, QUOTE_FIELDS, RAW_BANDED_FIELDS, DECLINE_RATE,
+    factor_table_name, normalize_option, normalize_age_band,
+)
+from .banding import PET_AGE, PET_AGE_GENDER
+
+# -------------------------
+# Vectorised rating arrays
+# -------------------------
+# The compiled rate table re-laid out as NumPy arrays so whole columns of risks
+# can be priced with integer indexing instead of one DataFrame merge per factor:
+#   base_rate[pet, scheme], limit[pet, scheme], factors[f]["rates"][pet, scheme, option]
+# Rebuilt whenever get_rate_table() hands back a new table; one set per rate set.
+_RATE_ARRAYS_STATE = {}  # {rate set: (rate table, arrays)}
+_RATE_ARRAYS_LOCK = threading.Lock()
+
+
+def build_rate_arrays(table):
+    """
+    Convert the compiled rate table into dense NumPy arrays.
+    Missing rates are NaN.
+    """
+    pet_types = sorted({pet_type for pet_type, _ in table})
+    schemes = sorted({scheme for _, scheme in table})
+    pet_index = {pet_type: i for i, pet_type in enumerate(pet_types)}
+    scheme_index = {scheme: i for i, scheme in enumerate(schemes)}
+    shape = (len(pet_types), len(schemes))
+
+    base_rate = np.full(shape, np.nan)
+    limit = np.full(shape, np.nan)
+    for (pet_type, scheme), entry in table.items():
+        p, s = pet_index[pet_type], scheme_index[scheme]
+        base_rate[p, s] = entry["factors"].get("base_rate", np.nan)
+        limit[p, s] = np.nan if entry["limit"] is None else entry["limit"]
+
+    factors = {}
+    for factor in RATING_FACTORS:
+        # Collect the option vocabulary across every pet type / scheme
+        options = sorted({
+            option
+            for (pet_type, _), entry in table.items()
+            for option in entry["factors"].get(factor_table_name(factor, pet_type), {})
+        })
+        option_index = {option: i for i, option in enumerate(options)}
+
+        rates = np.full(shape + (len(options),), np.nan)
+        for (pet_type, scheme), entry in table.items():
+            p, s = pet_index[pet_type], scheme_index[scheme]
+            for option, rate in entry["factors"].get(factor_table_name(factor, pet_type), {}).items():
+                rates[p, s, option_index[option]] = rate
+
+        factors[factor] = {"options": pd.Index(options), "rates": rates}
+
+    return {
+        "pet_types": pd.Index(pet_types),
+        "schemes": pd.Index(schemes),
+        "base_rate": base_rate,
+        "limit": limit,
+        "factors": factors,
+    }
+
+
+def get_rate_arrays(rate_set=None):
+    """Return the NumPy rating arrays for the current compiled rate table of a rate set (None = working rates)."""
+    global _RATE_ARRAYS_STATE
+
+    table = get_rate_table(rate_set)
+    cached_table, arrays = _RATE_ARRAYS_STATE.get(rate_set, (None, None))
+    if cached_table is table:
+        return arrays
+
+    with _RATE_ARRAYS_LOCK:
+        cached_table, arrays = _RATE_ARRAYS_STATE.get(rate_set, (None, None))
+        if cached_table is not table:
+            arrays = build_rate_arrays(table)
+            _RATE_ARRAYS_STATE = {**_RATE_ARRAYS_STATE, rate_set: (table, arrays)}
+
+    return arrays
+
+
+def factorize(values, normalize=normalize_option):
+    """
+    Factorise a column and normalise only its distinct values.
+    Returns (codes, labels): codes index into labels, -1 for nulls.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, copy=False), use_na_sentinel=True)
+    return codes, [normalize(value) for value in uniques]
+
+
+def encode(codes, labels, categories):
+    """Re-map factorised codes onto a fixed vocabulary (-1 where not found or blank)."""
+    label_codes = categories.get_indexer(pd.Index(labels, dtype=object))
+    label_codes[[isinstance(label, str) and label == "" for label in labels]] = -1
+    return np.where(codes >= 0, np.append(label_codes, -1)[codes], -1)
+
+
+def combine(left, right, fmt="{}: {}"):
+    """Factorised 'left: right' labels (e.g. gender + age band) without building strings per row."""
+    left_codes, left_labels = left
+    right_codes, right_labels = right
+    codes = np.where(
+        (left_codes >= 0) & (right_codes >= 0),
+        left_codes * len(right_labels) + right_codes,
+        -1,
+    )
+    labels = [
+        fmt.format(l, r) if l and r else ""
+        for l in left_labels
+        for r in right_labels
+    ]
+    return codes, labels
+
+
+def exact(value):
+    """No normalisation: options must match the rating guide label exactly (DataFrame.merge semantics)."""
+    return value
+
+
+def encode_keys(arrays, pet_type_col, scheme_col, normalize=normalize_option):
+    """(pet, scheme) array indices for each row, -1 where the pet type / scheme is unrated."""
+    pet_codes = encode(*factorize(pet_type_col, normalize), arrays["pet_types"])
+    scheme_codes = encode(
+        *factorize(scheme_col, lambda value: normalize(value).replace(" ", "_")),
+        arrays["schemes"],
+    )
+    unrated = (pet_codes < 0) | (scheme_codes < 0)
+    pet_codes[unrated] = -1
+    scheme_codes[unrated] = -1
+    return pet_codes, scheme_codes
+
+
+def gather(rates, pet_codes, scheme_codes, option_codes=None):
+    """Fancy-index rates by code, NaN wherever any code is -1."""
+    found = pet_codes >= 0
+    if option_codes is not None:
+        found &= option_codes >= 0
+        values = rates[pet_codes, scheme_codes, option_codes]
+    else:
+        values = rates[pet_codes, scheme_codes]
+    return np.where(found, values, np.nan)
+
+
+def risk_option_codes(df):
+    """
+    Column version of pricing.risk_options: raw premium calculator fields in,
+    factorised (codes, labels) per rating factor out.
+    """
+    def field(name, normalize=normalize_option):
+        values = df[name] if name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        return factorize(values, normalize)
+
+    def or_band(factorized, raw_name, band):
+        # Fall back to banding the raw value where no band label was given
+        if raw_name not in df.columns:
+            return factorized
+        codes, labels = factorized
+        blank = np.append(np.array([label == "" for label in labels], dtype=bool), True)[codes]
+        band_codes = band.codes(df[raw_name])
+        codes = np.where(blank & (band_codes >= 0), len(labels) + band_codes, codes)
+        return codes, labels + band.labels
+
+    gender = field("pet_gender")
+    options = {
+        "pet_age": or_band(field("pet_age2", normalize_age_band), "pet_age_months", PET_AGE),
+        "pet_age_gender": combine(
+            gender, or_band(field("pet_age1", normalize_age_band), "pet_age_months", PET_AGE_GENDER)
+        ),
+        "neutered_gender": combine(gender, field("neutered")),
+        "breed": field("breed"),
+    }
+    for name in QUOTE_FIELDS:
+        options[name] = field(name)
+    for name, (raw_name, band) in RAW_BANDED_FIELDS.items():
+        options[name] = or_band(options[name], raw_name, band)
+
+    return options
+
+
+def missing_labels(unrated):
+    """Comma-joined factor names per row from an (n_rows, n_factors) bool matrix."""
+    bits = unrated.astype(np.int64) @ (np.int64(1) << np.arange(len(RATING_FACTORS), dtype=np.int64))
+    patterns, inverse = np.unique(bits, return_inverse=True)
+    labels = np.array([
+        ",".join(factor for i, factor in enumerate(RATING_FACTORS) if pattern >> i & 1)
+        for pattern in patterns
+    ], dtype=object)
+    return labels[inverse]
+
+
+def price_risks(risks, rate_set=None):
+    """
+    Price many risks in one pass.
+    risks is a DataFrame (or list of dicts) with the same fields as the
+    rates/quote/ endpoint: pet_type, cover_level, pet_gender, pet_age1, pet_age2,
+    breed, neutered, pet_price, ... multipet.
+    Returns a DataFrame with the input columns plus base_rate, limit, one
+    <factor>_factor column per factor, premium, decline_flag and missing.
+    Pricing rules match pricing.quote_premium: unknown breeds are declined,
+    unanswered or unknown options are listed in missing and leave the premium NaN.
+    rate_set prices with a published RateSet instead of the working rates.
+    """
+    df = risks if isinstance(risks, pd.DataFrame) else pd.DataFrame(list(risks))
+    df = df.reset_index(drop=True)
+    n = len(df)
+
+    arrays = get_rate_arrays(rate_set)
+    blank = pd.Series(None, index=df.index, dtype=object)
+    pet_codes, scheme_codes = encode_keys(
+        arrays, df.get("pet_type", blank), df.get("cover_level", blank)
+    )
+
+    out = df.copy()
+    out["base_rate"] = gather(arrays["base_rate"], pet_codes, scheme_codes)
+    out["limit"] = gather(arrays["limit"], pet_codes, scheme_codes)
+
+    premium = out["base_rate"].to_numpy(copy=True)
+    unrated = np.zeros((n, len(RATING_FACTORS)), dtype=bool)
+    option_codes = risk_option_codes(df)
+
+    for i, factor in enumerate(RATING_FACTORS):
+        codes, labels = option_codes[factor]
+        factor_arrays = arrays["factors"][factor]
+        rates = gather(factor_arrays["rates"], pet_codes, scheme_codes, encode(codes, labels, factor_arrays["options"]))
+
+        # Breeds that cannot be matched to the rating guide are declined
+        if factor == "breed":
+            answered = np.append(np.array([label != "" for label in labels], dtype=bool), False)[codes]
+            rates[np.isnan(rates) & answered & (pet_codes >= 0)] = DECLINE_RATE
+
+        unrated[:, i] = np.isnan(rates)
+        out[f"{factor}_factor"] = rates
+        premium *= np.where(unrated[:, i], 1.0, rates)
+
+    factor_cols = [f"{factor}_factor" for factor in RATING_FACTORS]
+    out["premium"] = np.where(unrated.any(axis=1), np.nan, premium)
+    out["decline_flag"] = np.where((out[factor_cols] == DECLINE_RATE).any(axis=1), "Y", "N")
+    out["missing"] = missing_labels(unrated)
+
+    return out
+
+
+def rate_columns(df, factors, arrays, pet_type_col="pet_type", scheme_col="scheme", base_rate=True):
+    """{column: values} of the rates apply_rates adds, looked up in one set of rating arrays."""
+    pet_codes, scheme_codes = encode_keys(arrays, df[pet_type_col], df[scheme_col], normalize=exact)
+
+    columns = {}
+    if base_rate:
+        columns["base_rate"] = gather(arrays["base_rate"], pet_codes, scheme_codes)
+        columns["limit"] = gather(arrays["limit"], pet_codes, scheme_codes)
+
+    for factor in factors:
+        factor_arrays = arrays["factors"][factor]
+        codes, labels = factorize(df[factor], exact)
+        columns[f"{factor}_factor"] = gather(
+            factor_arrays["rates"], pet_codes, scheme_codes, encode(codes, labels, factor_arrays["options"])
+        )
+
+    return columns
+
+
+def apply_rates(df, factors, pet_type_col="pet_type", scheme_col="scheme", base_rate=True, rate_set=None):
+    """
+    Add rate columns to a portfolio DataFrame in place, replacing one
+    DataFrame.merge per factor with an array gather.
+    Each factor's option is read from the column of the same name
+    (e.g. df["ph_age"]) and its rate written to <factor>_factor. With
+    base_rate=True, base_rate and limit are added first.
+    Matches the old left-merge semantics exactly: options are not normalised
+    and anything unmatched is NaN. Scheme names may use spaces or underscores.
+    rate_set picks the rates: None for the working rates, a RateSet id, or one
+    id per row (e.g. from rate_sets_in_force) to price each row with its own.
+    """
+    if np.ndim(rate_set) > 0 and len(df) == 0:
+        rate_set = None
+
+    if np.ndim(rate_set) == 0:
+        columns = rate_columns(df, factors, get_rate_arrays(rate_set), pet_type_col, scheme_col, base_rate)
+    else:
+        # Price each rate set's rows in turn and scatter the results back
+        keys = pd.Series(np.asarray(rate_set, dtype=object), index=df.index)
+        columns = {}
+        for key, rows in keys.groupby(keys.fillna(-1), sort=False).indices.items():
+            part = rate_columns(
+                df.iloc[rows], factors, get_rate_arrays(None if key == -1 else int(key)),
+                pet_type_col, scheme_col, base_rate,
+            )
+            for col, values in part.items():
+                columns.setdefault(col, np.full(len(df), np.nan))[rows] = values
+
+    for col, values in columns.items():
+        df[col] = values
+
+    return df
@@ -0,0 +1,232 @@
+import io
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from base import static_data
+
+# -------------------------
+# Re-rated policy reports
+# -------------------------
+# Reports read the re-rated dataset directly instead of loading the whole frame:
+# only the columns a report needs are read, and the filters are pushed down
+# into the scan so partitions and row groups that cannot match are skipped.
+
+# Columns read for the monthly summary
+SUMMARY_COLUMNS = ["inception_month", "gwp_per_pet", "re_rated_gwp_per_pet"]
+
+# Columns returned by the paginated detail endpoint
+DETAIL_COLUMNS = [
+    "policy_number", "adjustment_number", "effective_date", "inception_month", "transaction_name",
+    "pet_name", "pettype", "breed", "scheme", "copay", "decline_flag",
+    "gwp_per_pet", "re_rated_gwp_per_pet", "re_rated_gwp_per_pol",
+]
+
+# Rows read per batch while filling a detail page
+DETAIL_BATCH_ROWS = 10_000
+
+
+# (file stamp, cube) of the rate-index cube last read
+_CUBE_STATE = (None, None)
+_CUBE_LOCK = threading.Lock()
+
+
+def report_filters(asat_date=None, copay=None, scheme=None, pettype=None):
+    """
+    Parquet filters for the re-rated report: accepted New Business rows,
+    optionally up to an as-at inception month and for one co-pay option,
+    scheme or pet type ('*' = all).
+    """
+    filters = [("decline_flag", "==", "N"), ("transaction_name", "==", "New Business")]
+    if asat_date is not None:
+        filters.append(("inception_month", "<=", float(asat_date)))
+    for col, value in [("copay", copay), ("scheme", scheme), ("pettype", pettype)]:
+        if value not in (None, "", "*"):
+            filters.append((col, "==", value))
+    return filters
+
+
+def apply_filters(df, filters):
+    """Apply report_filters() to an in-memory DataFrame."""
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        if op == "==":
+            mask &= df[col] == value
+        elif op == "<=":
+            mask &= df[col] <= value
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+    return df[mask]
+
+
+def rate_index_cube():
+    """
+    The precomputed rate-index cube (see static_data.build_rate_index_cube),
+    re-read only when the file changes. None if it has not been built.
+    """
+    global _CUBE_STATE
+
+    stamp = static_data._file_stamp(static_data.RE_RATED_CUBE_FILE)
+    if stamp is None:
+        return None
+
+    cached_stamp, cube = _CUBE_STATE
+    if cube is not None and cached_stamp == stamp:
+        return cube
+
+    with _CUBE_LOCK:
+        cached_stamp, cube = _CUBE_STATE
+        if cube is None or cached_stamp != stamp:
+            cube = pd.read_parquet(static_data.RE_RATED_CUBE_FILE)
+            _CUBE_STATE = (stamp, cube)
+
+    return cube
+
+
+def read_re_rated(columns=None, filters=None):
+    """Read selected columns / rows of the re-rated policies (empty frame if not built yet)."""
+    if not static_data.RE_RATED_MANIFEST.exists():
+        print("⚠️ Re-rated dataset not found — run re_rated_cache() first.")
+        return pd.DataFrame(columns=columns)
+    return static_data.read_re_rated(columns, filters)
+
+
+def monthly_summary(asat_date=None, copay=None, scheme=None, pettype=None):
+    """
+    GWP and re-rated GWP summed by inception month, with the rate index
+    (re-rated / actual) and its month-on-month change.
+    Answered from the rate-index cube; scans the policies only if it is missing.
+    """
+    filters = report_filters(asat_date, copay, scheme, pettype)
+    cube = rate_index_cube()
+    if cube is not None:
+        df = apply_filters(cube, filters)
+    else:
+        df = read_re_rated(SUMMARY_COLUMNS, filters)
+
+    df_sum = (
+        df.groupby("inception_month", as_index=False)[["gwp_per_pet", "re_rated_gwp_per_pet"]]
+        .sum()
+        .rename(columns={"gwp_per_pet": "gwp", "re_rated_gwp_per_pet": "re_rated_gwp"})
+        .sort_values("inception_month")
+    )
+    df_sum["rate_index"] = static_data.div0(df_sum["re_rated_gwp"], df_sum["gwp"])
+    df_sum["rate_change"] = df_sum["rate_index"].pct_change()
+    return df_sum
+
+
+def report_row_count(filters):
+    """Rows matching report_filters(), from the rate-index cube (or the dataset's file metadata if it is missing)."""
+    cube = rate_index_cube()
+    if cube is not None:
+        return int(apply_filters(cube, filters)["rows"].sum())
+    return static_data.count_re_rated(filters)
+
+
+def policy_detail(page=1, page_size=100, asat_date=None, copay=None, scheme=None, pettype=None):
+    """
+    One page of the re-rated rows behind the summary (same filters).
+    Batches are streamed only until the page is filled, and the total is
+    counted without reading the rows. Returns (rows DataFrame, total row count).
+    """
+    if not static_data.RE_RATED_MANIFEST.exists():
+        print("⚠️ Re-rated dataset not found — run re_rated_cache() first.")
+        return pd.DataFrame(columns=DETAIL_COLUMNS), 0
+
+    filters = report_filters(asat_date, copay, scheme, pettype)
+    start, stop = (page - 1) * page_size, page * page_size
+
+    seen, rows = 0, []
+    for batch in static_data.iter_re_rated(DETAIL_COLUMNS, filters, DETAIL_BATCH_ROWS):
+        first, last = max(start - seen, 0), min(stop - seen, len(batch))
+        if last > first:
+            rows.append(batch.slice(first, last - first))
+        seen += len(batch)
+        if seen >= stop:
+            break
+
+    df = pa.Table.from_batches(rows, schema=static_data.re_rated_schema(DETAIL_COLUMNS)).to_pandas()
+    return df, report_row_count(filters)
+
+
+# -------------------------
+# Streaming exports
+# -------------------------
+# Exports stream the filtered re-rated rows batch by batch straight from the
+# dataset, so memory stays bounded by the batch size, not the portfolio.
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+EXPORT_BATCH_ROWS = 50_000
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last take()."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def export_columns(columns=None):
+    """
+    The columns an export will have: all of the dataset's, or the requested
+    ones in the order given. Raises ValueError for unknown columns.
+    """
+    available = static_data.re_rated_schema().names
+    if not columns:
+        return available
+    unknown = [col for col in columns if col not in available]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    return list(columns)
+
+
+def export_re_rated(fmt="csv", columns=None, asat_date=None, copay=None, scheme=None, pettype=None):
+    """
+    The re-rated rows matching the report filters as an iterator of CSV or
+    Parquet bytes, one chunk per batch. Format, columns and the dataset are
+    checked up front (ValueError / FileNotFoundError), before anything streams.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if not static_data.RE_RATED_MANIFEST.exists():
+        raise FileNotFoundError("Re-rated dataset not found — run re_rated_cache() first.")
+
+    columns = export_columns(columns)
+    batches = static_data.iter_re_rated(
+        columns, report_filters(asat_date, copay, scheme, pettype), EXPORT_BATCH_ROWS
+    )
+    if fmt == "csv":
+        return _csv_chunks(columns, batches)
+    return _parquet_chunks(static_data.re_rated_schema(columns), batches)
+
+
+def _csv_chunks(columns, batches):
+    yield pd.DataFrame(columns=columns).to_csv(index=False).encode("utf-8")
+    for batch in batches:
+        yield batch.to_pandas().to_csv(index=False, header=False).encode("utf-8")
+
+
+def _parquet_chunks(schema, batches):
+    # One row group per batch; the footer is written when the writer closes
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_batches([batch]))
+            yield sink.take()
+    yield sink.take()
@@ -1,15 +1,29 @@
-import pickle
-from pathlib import Path
+from pathlib import Path, PureWindowsPath
 from django.db.models import Q
 import pandas as pd
+import numpy as np
 from collections import defaultdict
 from base.models import (
     PolicyMaster, PolicyHistory, Risk, TransactionType, PetRiskPet,
     DefinedListDetail, PetRisk, PetProposer, Address, SchemeQuoteResultComment, PetRates
 )
 from .utils import *
+from .static_store import (
+    write_store, read_manifest, read_table, partitioning, write_partitioned, read_partitioned,
+    iter_partitioned, count_partitioned, dataset_schema, MANIFEST_NAME,
+)
+import pyarrow as pa
+from .pricing import PREMIUM_FORMULA
+from .rating_engine import apply_rates
+from .rate_table import rate_sets_in_force
+from .rate_snapshot import write_rate_snapshot
+from .features import (
+    add_policy_period, age_in_years, age_in_months, crossbreed_breed, quote_breed, add_banded_features,
+)
 import json
 import os
+import threading
+from datetime import datetime, timezone
 
 # Helper to convert defaultdict -> dict recursively
 def convert_defaultdict(d):
@@ -37,21 +51,24 @@ def div0(numerator, denominator):
 
 rating_guide =  r'C:\Users\jorda\OneDrive - Only Pets Cover Limited\Desktop\SP Rating Guide v40 - Breed changes.xlsx'
 
-pet_age_order = ['0','1','2','3','4','5','6','7','8','9','10','11','12','13','14','15','16',
-             '17','18','19','20','21','22','23','24–28','29–31','32–34','35–37','38–40',
-             '41–43','44–46','47–48','49–54','55–60','61–66','67–72','73–78','79–84',
-             '85–90','91–96','97–102','103–108','109–114','115–120','121–126','127–132',
-             '133–138','139–144','145–150','151–156','157–162','163–168','169–174','175–180',
-             '181–186','187–192','193–204','205–216','217–228','229–240','241+']
-
-ph_age_order = ['0 - 19.999','20 - 29.999','30 - 39.999','40 - 49.999','50 - 59.999','60 - 69.999','70 - 79.999','80 - 89.999','90 and over']
-
-pet_price_order = [ '£0–£75','£76–£150','£151–£300','£301–£600','£601–£1,200','£1,201+']
 
 
 output_folder = Path(__file__).resolve().parent / "static_data"
-CACHE_FILE = output_folder / "policy_cache.pkl"
-RE_RATED_FILE = output_folder / "df_merged.parquet"
+STATIC_STORE_FOLDER = output_folder / "static_cache"
+RE_RATED_DATASET = output_folder / "re_rated"
+RE_RATED_MANIFEST = RE_RATED_DATASET / MANIFEST_NAME  # replaced on every publish
+RE_RATED_META_FILE = output_folder / "re_rated_meta.json"
+RE_RATED_CUBE_FILE = output_folder / "re_rated_cube.parquet"
+RATE_SNAPSHOT_FILE = output_folder / "rates_snapshot.bin"
+
+# Dimensions of the precomputed rate-index cube
+RATE_INDEX_DIMENSIONS = ["inception_month", "scheme", "pettype", "copay", "transaction_name", "decline_flag"]
+
+# The re-rated policies are partitioned by transaction type and underwriting month
+RE_RATED_PARTITIONING = partitioning([
+    ("transaction_name", pa.string()),
+    ("inception_month", pa.float64()),
+])
 
 debugging_folder = Path(__file__).resolve().parent / "debugging"
 debug = "No"
@@ -59,18 +76,55 @@ debug = "No"
 # -------------------------
 # In-memory caches
 # -------------------------
-POLICY_MASTER_CACHE = {}
-POLICY_HISTORY_CACHE = {}
-RISK_CACHE = {}
-TRANSACTION_TYPE_CACHE = {}
-PET_RISK_PET_CACHE = {}
-DEFINED_LIST_DETAIL_CACHE = {}
-PET_RISK_CACHE = {}
-PET_PROPOSER_CACHE = {}
-ADDRESS_CACHE = {}
-SCHEME_QUOTE_RESULT_COMMENT_CACHE = {}
+# One DataFrame per source table, holding only the columns the re-rating
+# pipeline reads (STATIC_COLUMNS), fetched with values_list - no model instances.
+POLICY_MASTER_CACHE = pd.DataFrame()
+POLICY_HISTORY_CACHE = pd.DataFrame()
+RISK_CACHE = pd.DataFrame()
+TRANSACTION_TYPE_CACHE = pd.DataFrame()
+PET_RISK_PET_CACHE = pd.DataFrame()
+DEFINED_LIST_DETAIL_CACHE = pd.DataFrame()
+PET_RISK_CACHE = pd.DataFrame()
+PET_PROPOSER_CACHE = pd.DataFrame()
+ADDRESS_CACHE = pd.DataFrame()
+SCHEME_QUOTE_RESULT_COMMENT_CACHE = pd.DataFrame()
 RE_RATED_CACHE: pd.DataFrame | None = None
 
+# Highest primary key loaded into each cache (plus the latest PolicyHistory
+# CreationDate), saved with the caches so sync_static_data() only has to fetch
+# rows beyond them.
+STATIC_WATERMARKS = {}
+
+# Columns fetched per model
+STATIC_COLUMNS = {
+    "PolicyMaster": ["policy_master_id", "policy_number"],
+    "PolicyHistory": [
+        "policy_master_id", "scheme_quote_result_id", "transaction_type_id", "risk_id", "effective_date",
+        "gwp", "adjustment_number", "payment_schedule_id", "total_paid_by_customer",
+        "policy_history_id", "creation_date",
+    ],
+    "Risk": ["risk_id", "copay"],
+    "TransactionType": ["transaction_type_id", "transaction_name"],
+    "PetRiskPet": [
+        "pet_risk_pet_id", "pet_name", "risk_id", "pet_type_dldid", "pet_sub_type_dldid", "breed_dldid",
+        "size_dldid", "gender_dldid", "cost_of_pet", "pet_dob", "prn", "neutered", "chipped",
+        "vaccinations", "pre_existing", "aggressive", "is_pet_yours",
+    ],
+    "DefinedListDetail": ["defined_list_detail_id", "dld_name", "unique_id"],
+    "PetRisk": ["risk_id", "pet_proposer_id", "pet_cover_level_dldid"],
+    "PetProposer": ["pet_proposer_id", "address_id", "ph_dob", "uk_resident", "kept_at_address", "trade_business"],
+    "Address": ["address_id", "postcode"],
+    "SchemeQuoteResultComment": ["scheme_quote_result_comment_id", "scheme_quote_result_id", "comment_text", "premium_total"],
+}
+
+
+def fetch_columns(model, where=Q()):
+    """Fetch a model's STATIC_COLUMNS straight into a DataFrame."""
+    fields = STATIC_COLUMNS[model.__name__]
+    rows = model.objects.using("default").filter(where).values_list(*fields)
+    return pd.DataFrame(list(rows.iterator()), columns=fields)
+
+
 # -------------------------
 # Load from DB (initial load)
 # -------------------------
@@ -80,30 +134,26 @@ def load_static_data():
     """
     global POLICY_MASTER_CACHE, POLICY_HISTORY_CACHE, RISK_CACHE, TRANSACTION_TYPE_CACHE
     global PET_RISK_PET_CACHE, DEFINED_LIST_DETAIL_CACHE, PET_RISK_CACHE, PET_PROPOSER_CACHE
-    global ADDRESS_CACHE, SCHEME_QUOTE_RESULT_COMMENT_CACHE
+    global ADDRESS_CACHE, SCHEME_QUOTE_RESULT_COMMENT_CACHE, STATIC_WATERMARKS
 
     print("🔄 Loading static data from database...")
 
-    POLICY_MASTER_CACHE = {pm.policy_master_id: pm for pm in PolicyMaster.objects.using("default").all()}
-    POLICY_HISTORY_CACHE = {ph.policy_history_id: ph for ph in PolicyHistory.objects.using("default").all()}
-    RISK_CACHE = {r.risk_id: r for r in Risk.objects.using("default").all()}
-    TRANSACTION_TYPE_CACHE = {tt.transaction_type_id: tt for tt in TransactionType.objects.using("default").all()}
-    PET_RISK_PET_CACHE = {prp.pet_risk_pet_id: prp for prp in PetRiskPet.objects.using("default").all()}
-    DEFINED_LIST_DETAIL_CACHE = {dld.defined_list_detail_id: dld for dld in DefinedListDetail.objects.using("default").all()}
-    PET_RISK_CACHE = {pr.risk_id: pr for pr in PetRisk.objects.using("default").all()}
-    PET_PROPOSER_CACHE = {pp.pet_proposer_id: pp for pp in PetProposer.objects.using("default").all()}
-    ADDRESS_CACHE = {a.address_id: a for a in Address.objects.using("default").all()}
+    POLICY_MASTER_CACHE = fetch_columns(PolicyMaster)
+    POLICY_HISTORY_CACHE = fetch_columns(PolicyHistory)
+    RISK_CACHE = fetch_columns(Risk)
+    TRANSACTION_TYPE_CACHE = fetch_columns(TransactionType)
+    PET_RISK_PET_CACHE = fetch_columns(PetRiskPet)
+    DEFINED_LIST_DETAIL_CACHE = fetch_columns(DefinedListDetail)
+    PET_RISK_CACHE = fetch_columns(PetRisk)
+    PET_PROPOSER_CACHE = fetch_columns(PetProposer)
+    ADDRESS_CACHE = fetch_columns(Address)
 
     # Load filtered SchemeQuoteResultComment cache
-    policy_ids = set(PolicyHistory.objects.using("default").values_list('scheme_quote_result_id', flat=True))
-    SCHEME_QUOTE_RESULT_COMMENT_CACHE.clear()
-    SCHEME_QUOTE_RESULT_COMMENT_CACHE.update({
-        sqrc.scheme_quote_result_comment_id: sqrc
-        for sqrc in SchemeQuoteResultComment.objects.using("default").filter(
-            Q(comment_text__icontains="Belongs to proposer"),
-            scheme_quote_result_id__in=policy_ids
-        )
-    })
+    policy_ids = PolicyHistory.objects.using("default").values("scheme_quote_result_id")
+    SCHEME_QUOTE_RESULT_COMMENT_CACHE = fetch_columns(
+        SchemeQuoteResultComment,
+        Q(comment_text__icontains="Belongs to proposer") & Q(scheme_quote_result_id__in=policy_ids),
+    )
 
     print(f"✅ Loaded {len(POLICY_MASTER_CACHE)} PolicyMaster records")
     print(f"✅ Loaded {len(POLICY_HISTORY_CACHE)} PolicyHistory records")
@@ -116,57 +166,192 @@ def load_static_data():
     print(f"✅ Loaded {len(ADDRESS_CACHE)} Address records")
     print(f"✅ Loaded {len(SCHEME_QUOTE_RESULT_COMMENT_CACHE)} Scheme Quote Result Comment records")
 
+    STATIC_WATERMARKS = static_watermarks()
+
+# -------------------------
+# Delta sync from DB
+# -------------------------
+def _max_key(cache, model):
+    """Highest primary key in a cache, None if it is empty."""
+    pk = model._meta.pk.name
+    if cache.empty or pk not in cache.columns or cache[pk].isna().all():
+        return None
+    return cache[pk].max()
+
+
+def static_watermarks():
+    """Highest primary key per cache and the latest PolicyHistory CreationDate."""
+    watermarks = {
+        "PolicyMaster": _max_key(POLICY_MASTER_CACHE, PolicyMaster),
+        "PolicyHistory": _max_key(POLICY_HISTORY_CACHE, PolicyHistory),
+        "Risk": _max_key(RISK_CACHE, Risk),
+        "TransactionType": _max_key(TRANSACTION_TYPE_CACHE, TransactionType),
+        "PetRiskPet": _max_key(PET_RISK_PET_CACHE, PetRiskPet),
+        "DefinedListDetail": _max_key(DEFINED_LIST_DETAIL_CACHE, DefinedListDetail),
+        "PetRisk": _max_key(PET_RISK_CACHE, PetRisk),
+        "PetProposer": _max_key(PET_PROPOSER_CACHE, PetProposer),
+        "Address": _max_key(ADDRESS_CACHE, Address),
+        "SchemeQuoteResultComment": _max_key(SCHEME_QUOTE_RESULT_COMMENT_CACHE, SchemeQuoteResultComment),
+    }
+    creation_date = POLICY_HISTORY_CACHE["creation_date"].max() if not POLICY_HISTORY_CACHE.empty else None
+    watermarks["PolicyHistoryCreationDate"] = None if pd.isna(creation_date) else creation_date
+    return watermarks
+
+
+def _after(watermark):
+    """Filter for rows with a primary key above the watermark (every row if there is none)."""
+    return Q(pk__gt=watermark) if watermark is not None else Q()
+
+
+def _append_rows(cache, new_rows, model):
+    """Add newly fetched rows to a cache (a re-fetched key replaces the old row)."""
+    merged = new_rows if cache.empty else pd.concat([cache, new_rows], ignore_index=True)
+    merged = merged.drop_duplicates(model._meta.pk.name, keep="last").reset_index(drop=True)
+    print(f"✅ Synced {len(new_rows)} new {model.__name__} records ({len(merged)} total)")
+    return merged
+
+
+def sync_static_data():
+    """
+    Fetch only the rows added since the last load / sync and merge them into the caches.
+    New PolicyHistory rows are found by PolicyHistoryID or CreationDate, every
+    other table by primary key. Rows edited in place keep their key, so they are
+    only picked up by a full load_static_data().
+    """
+    global POLICY_MASTER_CACHE, POLICY_HISTORY_CACHE, RISK_CACHE, TRANSACTION_TYPE_CACHE
+    global PET_RISK_PET_CACHE, DEFINED_LIST_DETAIL_CACHE, PET_RISK_CACHE, PET_PROPOSER_CACHE
+    global ADDRESS_CACHE, SCHEME_QUOTE_RESULT_COMMENT_CACHE, STATIC_WATERMARKS
+
+    if not STATIC_WATERMARKS:
+        load_static_cache()
+    if not STATIC_WATERMARKS and not POLICY_HISTORY_CACHE.empty:
+        # Cache saved before watermarks were recorded
+        STATIC_WATERMARKS = static_watermarks()
+    if not STATIC_WATERMARKS:
+        print("⚠️ No watermarks found — running a full load.")
+        load_static_data()
+        return
+
+    print("🔄 Syncing static data from database...")
+    watermarks = STATIC_WATERMARKS
+
+    history_filter = _after(watermarks["PolicyHistory"])
+    if watermarks["PolicyHistoryCreationDate"] is not None:
+        history_filter |= Q(creation_date__gt=watermarks["PolicyHistoryCreationDate"])
+    new_history = PolicyHistory.objects.using("default").filter(history_filter)
+
+    POLICY_MASTER_CACHE = _append_rows(POLICY_MASTER_CACHE, fetch_columns(PolicyMaster, _after(watermarks["PolicyMaster"])), PolicyMaster)
+    POLICY_HISTORY_CACHE = _append_rows(POLICY_HISTORY_CACHE, fetch_columns(PolicyHistory, history_filter), PolicyHistory)
+    RISK_CACHE = _append_rows(RISK_CACHE, fetch_columns(Risk, _after(watermarks["Risk"])), Risk)
+    TRANSACTION_TYPE_CACHE = _append_rows(TRANSACTION_TYPE_CACHE, fetch_columns(TransactionType, _after(watermarks["TransactionType"])), TransactionType)
+    PET_RISK_PET_CACHE = _append_rows(PET_RISK_PET_CACHE, fetch_columns(PetRiskPet, _after(watermarks["PetRiskPet"])), PetRiskPet)
+    DEFINED_LIST_DETAIL_CACHE = _append_rows(DEFINED_LIST_DETAIL_CACHE, fetch_columns(DefinedListDetail, _after(watermarks["DefinedListDetail"])), DefinedListDetail)
+    PET_RISK_CACHE = _append_rows(PET_RISK_CACHE, fetch_columns(PetRisk, _after(watermarks["PetRisk"])), PetRisk)
+    PET_PROPOSER_CACHE = _append_rows(PET_PROPOSER_CACHE, fetch_columns(PetProposer, _after(watermarks["PetProposer"])), PetProposer)
+    ADDRESS_CACHE = _append_rows(ADDRESS_CACHE, fetch_columns(Address, _after(watermarks["Address"])), Address)
+
+    # Comments for new policy transactions, plus new comments on existing ones
+    SCHEME_QUOTE_RESULT_COMMENT_CACHE = _append_rows(
+        SCHEME_QUOTE_RESULT_COMMENT_CACHE,
+        fetch_columns(
+            SchemeQuoteResultComment,
+            Q(comment_text__icontains="Belongs to proposer") & (
+                Q(scheme_quote_result_id__in=new_history.values("scheme_quote_result_id")) |
+                (_after(watermarks["SchemeQuoteResultComment"]) &
+                 Q(scheme_quote_result_id__in=PolicyHistory.objects.using("default").values("scheme_quote_result_id")))
+            ),
+        ),
+        SchemeQuoteResultComment,
+    )
+
+    STATIC_WATERMARKS = static_watermarks()
+
 # -------------------------
 # Save cache to disk
 # -------------------------
+def _watermarks_to_json(watermarks):
+    """Watermarks as JSON-safe values (ints and ISO datetimes)."""
+    return {
+        name: value.isoformat() if hasattr(value, "isoformat") else (None if value is None else int(value))
+        for name, value in watermarks.items()
+    }
+
+
+def _watermarks_from_json(watermarks):
+    watermarks = dict(watermarks)
+    if watermarks.get("PolicyHistoryCreationDate") is not None:
+        watermarks["PolicyHistoryCreationDate"] = pd.Timestamp(watermarks["PolicyHistoryCreationDate"])
+    return watermarks
+
+
 def save_static_cache():
-    """Save all caches to disk."""
-    with open(CACHE_FILE, "wb") as f:
-        pickle.dump({
-            "POLICY_MASTER_CACHE": POLICY_MASTER_CACHE,
-            "POLICY_HISTORY_CACHE": POLICY_HISTORY_CACHE,
-            "RISK_CACHE": RISK_CACHE,
-            "TRANSACTION_TYPE_CACHE": TRANSACTION_TYPE_CACHE,
-            "PET_RISK_PET_CACHE": PET_RISK_PET_CACHE,
-            "DEFINED_LIST_DETAIL_CACHE": DEFINED_LIST_DETAIL_CACHE,
-            "PET_RISK_CACHE": PET_RISK_CACHE,
-            "PET_PROPOSER_CACHE": PET_PROPOSER_CACHE,
-            "ADDRESS_CACHE": ADDRESS_CACHE,
-            "SCHEME_QUOTE_RESULT_COMMENT_CACHE": SCHEME_QUOTE_RESULT_COMMENT_CACHE,
-        }, f)
-    print(f"✅ Saved cache to {CACHE_FILE}")
+    """Save all caches to disk: one Parquet file per table plus a manifest."""
+    write_store(STATIC_STORE_FOLDER, {
+        "PolicyMaster": POLICY_MASTER_CACHE,
+        "PolicyHistory": POLICY_HISTORY_CACHE,
+        "Risk": RISK_CACHE,
+        "TransactionType": TRANSACTION_TYPE_CACHE,
+        "PetRiskPet": PET_RISK_PET_CACHE,
+        "DefinedListDetail": DEFINED_LIST_DETAIL_CACHE,
+        "PetRisk": PET_RISK_CACHE,
+        "PetProposer": PET_PROPOSER_CACHE,
+        "Address": ADDRESS_CACHE,
+        "SchemeQuoteResultComment": SCHEME_QUOTE_RESULT_COMMENT_CACHE,
+    }, meta={"watermarks": _watermarks_to_json(STATIC_WATERMARKS)})
+    print(f"✅ Saved cache to {STATIC_STORE_FOLDER}")
 
 # -------------------------
 # Load cache from disk
 # -------------------------
+def read_static_table(name, columns=None):
+    """
+    Read one cached table (e.g. "PolicyHistory") from disk without loading the
+    rest, optionally only some columns. None if it has not been saved.
+    """
+    return read_table(STATIC_STORE_FOLDER, name, columns)
+
+
 def load_static_cache():
-    """Load all caches from disk (no DB contact)."""
+    """Load all caches from disk (no DB contact), reading only the STATIC_COLUMNS of each table."""
     global POLICY_MASTER_CACHE, POLICY_HISTORY_CACHE, RISK_CACHE, TRANSACTION_TYPE_CACHE
     global PET_RISK_PET_CACHE, DEFINED_LIST_DETAIL_CACHE, PET_RISK_CACHE, PET_PROPOSER_CACHE
-    global ADDRESS_CACHE, SCHEME_QUOTE_RESULT_COMMENT_CACHE, DF_MERGED_CACHE
-
-    if CACHE_FILE.exists():
-        with open(CACHE_FILE, "rb") as f:
-            data = pickle.load(f)
-            POLICY_MASTER_CACHE = data.get("POLICY_MASTER_CACHE", {})
-            POLICY_HISTORY_CACHE = data.get("POLICY_HISTORY_CACHE", {})
-            RISK_CACHE = data.get("RISK_CACHE", {})
-            TRANSACTION_TYPE_CACHE = data.get("TRANSACTION_TYPE_CACHE", {})
-            PET_RISK_PET_CACHE = data.get("PET_RISK_PET_CACHE", {})
-            DEFINED_LIST_DETAIL_CACHE = data.get("DEFINED_LIST_DETAIL_CACHE", {})
-            PET_RISK_CACHE = data.get("PET_RISK_CACHE", {})
-            PET_PROPOSER_CACHE = data.get("PET_PROPOSER_CACHE", {})
-            ADDRESS_CACHE = data.get("ADDRESS_CACHE", {})
-            SCHEME_QUOTE_RESULT_COMMENT_CACHE = data.get("SCHEME_QUOTE_RESULT_COMMENT_CACHE", {})
-            DF_MERGED_CACHE = data.get("DF_MERGED_CACHE", None)
-        print(f"✅ Loaded cache from {CACHE_FILE}")
-    else:
-        print("⚠️ No cache file found — run load_static_data() and build_re_rated_policies_cache() first.")
+    global ADDRESS_CACHE, SCHEME_QUOTE_RESULT_COMMENT_CACHE, STATIC_WATERMARKS
+
+    manifest = read_manifest(STATIC_STORE_FOLDER)
+    if manifest is None:
+        print("⚠️ No cache found — run load_static_data() and save_static_cache() first.")
+        return
+
+    def read(name):
+        df = read_table(STATIC_STORE_FOLDER, name, STATIC_COLUMNS[name], manifest)
+        return pd.DataFrame(columns=STATIC_COLUMNS[name]) if df is None else df
+
+    POLICY_MASTER_CACHE = read("PolicyMaster")
+    POLICY_HISTORY_CACHE = read("PolicyHistory")
+    RISK_CACHE = read("Risk")
+    TRANSACTION_TYPE_CACHE = read("TransactionType")
+    PET_RISK_PET_CACHE = read("PetRiskPet")
+    DEFINED_LIST_DETAIL_CACHE = read("DefinedListDetail")
+    PET_RISK_CACHE = read("PetRisk")
+    PET_PROPOSER_CACHE = read("PetProposer")
+    ADDRESS_CACHE = read("Address")
+    SCHEME_QUOTE_RESULT_COMMENT_CACHE = read("SchemeQuoteResultComment")
+    STATIC_WATERMARKS = _watermarks_from_json(manifest["meta"].get("watermarks", {}))
+    print(f"✅ Loaded cache from {STATIC_STORE_FOLDER} (saved {manifest['saved_at']})")
 
 # -------------------------
 # Load from Rating Guide (initial load)
 # -------------------------
-def all_rates():
+def all_rates(processes=None, version=None, effective_date=None):
+    """
+    Parse the rating guide and save every factor to PetRates.
+    The workbook is read once up front (processes > 1 reads its sheets in parallel).
+    With version and effective_date, the rates are also published as a RateSet
+    (giving only one of them raises ValueError before anything is written).
+    """
+    if (version is None) != (effective_date is None):
+        raise ValueError("❌ version and effective_date must be given together to publish a rate set.")
+
     combined_nested = {}
 
     # 🔸 Step 1: Define all rating factors to parse
@@ -190,17 +375,23 @@ def all_rates():
         ("Gender & Age", "Animal Age in Months", "Animal's Gender", "pet_age_gender", None),
     ]
 
+    breed_sheet = "Breed"
+
+    # Read every sheet once
+    sheets = read_rating_guide(
+        rating_guide, [sheet_name for sheet_name, *_ in factors_to_parse] + [breed_sheet], processes
+    )
+
     # 🔸 Step 2: Parse and merge each factor
     for sheet_name, h1, h2, factor_name, pet_filter in factors_to_parse:
-        table_rows = parse_rates_excel(rating_guide, sheet_name, h1, h2, factor_name, pet_filter)
+        table_rows = parse_rates_excel(rating_guide, sheet_name, h1, h2, factor_name, pet_filter, sheets=sheets)
         nested = build_nested_structure(table_rows, factor_name)
         merge_nested_structures(combined_nested, nested)
 
     # 🔸 Step 3: Add Breed Factors
-    breed_sheet = "Breed"
 
     # Dog Breeds
-    dog_rows = parse_rates_excel(rating_guide, breed_sheet, "Dog Breed", None, "dog_breed", "dog")
+    dog_rows = parse_rates_excel(rating_guide, breed_sheet, "Dog Breed", None, "dog_breed", "dog", sheets=sheets)
     # Normalize dog breeds
     for row in dog_rows:
         breed_dict = row.get("dog_breed")
@@ -216,7 +407,7 @@ def all_rates():
     merge_nested_structures(combined_nested, dog_nested)
 
     # Cat Breeds
-    cat_rows = parse_rates_excel(rating_guide, breed_sheet, "Cat Breed", None, "cat_breed", "cat")
+    cat_rows = parse_rates_excel(rating_guide, breed_sheet, "Cat Breed", None, "cat_breed", "cat", sheets=sheets)
     # Normalize cat breeds
     for row in cat_rows:
         breed_dict = row.get("cat_breed")
@@ -233,6 +424,13 @@ def all_rates():
     # 🔸 Step 4: Optionally save everything to DB
     save_nested_rates_to_db(combined_nested)
 
+    # Binary snapshot of the saved rates, for loading without Excel or the database
+    write_rate_snapshot(RATE_SNAPSHOT_FILE, source=PureWindowsPath(rating_guide).name)
+
+    # Keep this guide as a dated version for point-in-time re-rating
+    if version is not None:
+        publish_rate_set(version, effective_date, source=PureWindowsPath(rating_guide).name)
+
     nested_rates_dict = convert_defaultdict(combined_nested)
     dog_nested_dict = convert_defaultdict(dog_nested)
     cat_nested_dict = convert_defaultdict(cat_nested)
@@ -257,107 +455,94 @@ def all_rates():
     return nested_rates_dict, dog_nested_dict, cat_nested_dict
 
 # -------------------------
-# Build DF_MERGED_CACHE
+# Source DataFrames for re-rating
 # -------------------------
-def re_rated_cache():
+def static_frames():
     """
-    Build the final df_merged DataFrame and store it in DF_MERGED_CACHE.
+    The raw source DataFrames used to re-rate policies, taken from the in-memory caches.
     """
-    global DF_MERGED_CACHE
+    df_master = POLICY_MASTER_CACHE.copy()
+    print(f"✅ Loaded cache from POLICY_MASTER_CACHE: {(len(df_master))} rows")
 
-    # Make sure the base caches are loaded
-    load_static_cache()
+    df_history = POLICY_HISTORY_CACHE.drop(columns=["policy_history_id", "creation_date"])
+    print(f"✅ Loaded cache from POLICY_HISTORY_CACHE: {(len(df_history))} rows")
 
-    # --------------------------------------------------
-    # df_merged building logic goes here
-    # --------------------------------------------------
-# Convert to DataFrames
-    df_master = pd.DataFrame([{
-        "policy_master_id": m.policy_master_id,
-        "policy_number": m.policy_number
-    } for m in POLICY_MASTER_CACHE.values()])
-    print(f"✅ Loaded cache from POLICY_MASTER_CACHE: {(len(df_master))} rows")
+    df_tt = TRANSACTION_TYPE_CACHE.copy()
+    print(f"✅ Loaded cache from TRANSACTION_TYPE_CACHE: {(len(df_tt))} rows")
+
+    df_risk = RISK_CACHE.copy()
+    print(f"✅ Loaded cache from RISK_CACHE: {(len(df_risk))} rows")
+
+    df_prp = PET_RISK_PET_CACHE.copy()
+    print(f"✅ Loaded cache from PET_RISK_PET_CACHE: {(len(df_prp))} rows")
+
+    df_dld = DEFINED_LIST_DETAIL_CACHE.rename(columns={"defined_list_detail_id": "dld_id"})
+    print(f"✅ Loaded cache from DEFINED_LIST_DETAIL_CACHE: {(len(df_dld))} rows")
+
+    df_pr = PET_RISK_CACHE.copy()
+    print(f"✅ Loaded cache from PET_RISK_CACHE: {(len(df_pr))} rows")
+
+    df_pp = PET_PROPOSER_CACHE.copy()
+    print(f"✅ Loaded cache from PET_PROPOSER_CACHE: {(len(df_pp))} rows")
+
+    df_a = ADDRESS_CACHE.copy()
+    print(f"✅ Loaded cache from ADDRESS_CACHE: {(len(df_a))} rows")
+
+    # Premium per pet
+    df_sqrc = SCHEME_QUOTE_RESULT_COMMENT_CACHE.rename(columns={"premium_total": "prem_per_pet"})
+
+    return {
+        "master": df_master, "history": df_history, "tt": df_tt, "risk": df_risk,
+        "prp": df_prp, "dld": df_dld, "pr": df_pr, "pp": df_pp, "address": df_a, "sqrc": df_sqrc,
+    }
+
+
+# -------------------------
+# Build df_merged
+# -------------------------
+def build_policy_frame(frames, policy_master_ids=None):
+    """
+    Join the source frames into one row per pet per NB / REN transaction, with
+    every rating factor option. Pass policy_master_ids to build only those policies.
+    """
+    df_master = frames["master"]
+    df_history = frames["history"]
+    df_risk = frames["risk"]
+    df_prp = frames["prp"]
+    df_sqrc = frames["sqrc"]
+
+    if policy_master_ids is not None:
+        df_master = df_master[df_master["policy_master_id"].isin(policy_master_ids)]
+        df_history = df_history[df_history["policy_master_id"].isin(policy_master_ids)]
+        df_risk = df_risk[df_risk["risk_id"].isin(df_history["risk_id"])]
+        df_prp = df_prp[df_prp["risk_id"].isin(df_history["risk_id"])]
+        df_sqrc = df_sqrc[df_sqrc["scheme_quote_result_id"].isin(df_history["scheme_quote_result_id"])]
 
     # policy_number = 'SAP0079206'
     # df_master = df_master[df_master["policy_number"] == policy_number]
 
-    df_history = pd.DataFrame([{
-        "policy_master_id": h.policy_master_id,
-        "scheme_quote_result_id": h.scheme_quote_result_id,
-        "transaction_type_id": h.transaction_type_id,
-        "risk_id": h.risk_id,
-        "effective_date": h.effective_date,
-        "gwp": h.gwp,
-        "adjustment_number": h.adjustment_number,
-        "payment_schedule_id": h.payment_schedule_id,
-        "total_paid_by_customer": h.total_paid_by_customer
-    } for h in POLICY_HISTORY_CACHE.values()])
     df_history = df_history[
         df_history["payment_schedule_id"].notna() |
         (df_history["total_paid_by_customer"] != 0)
-    ]
-    print(f"✅ Loaded cache from POLICY_HISTORY_CACHE: {(len(df_history))} rows")
+    ].copy()
 
     min_yoa = 2023
-    df_history["yoa"] = df_history.apply(
-        lambda x: x["effective_date"].year,
-        axis = 1 
-    )
+    add_policy_period(df_history, "effective_date")
     df_history = df_history[df_history["yoa"] >= min_yoa]
-    df_history["inception_month"] = df_history.apply(
-        lambda x: (x["effective_date"].year) + div0(x["effective_date"].month, 100), 
-        axis = 1
-    )
-
-    df_tt = pd.DataFrame([{
-        "transaction_type_id": tt.transaction_type_id,
-        "transaction_name": tt.transaction_name
-    } for tt in TRANSACTION_TYPE_CACHE.values()])
-    print(f"✅ Loaded cache from TRANSACTION_TYPE_CACHE: {(len(df_tt))} rows")
 
-    df_risk = pd.DataFrame([{
-        "risk_id": r.risk_id,
-        "copay": r.copay
-    } for r in RISK_CACHE.values()])
-    print(f"✅ Loaded cache from RISK_CACHE: {(len(df_risk))} rows")
+    df_tt = frames["tt"]
 
     # Assume Non-Copay where NULL
-    df_risk["copay"] = df_risk["copay"].fillna(2)
-    
-    df_prp = pd.DataFrame([{
-        "pet_risk_pet_id": prp.pet_risk_pet_id,
-        "pet_name": prp.pet_name,
-        "risk_id": prp.risk_id,
-        "pet_type_dldid": prp.pet_type_dldid,
-        "pet_sub_type_dldid": prp.pet_sub_type_dldid,
-        "breed_dldid": prp.breed_dldid,
-        "size_dldid": prp.size_dldid,
-        "gender_dldid": prp.gender_dldid,
-        "cost_of_pet": prp.cost_of_pet,
-        "pet_dob": prp.pet_dob,
-        "pet_name": prp.pet_name,
-        "prn": prp.prn,
-        "neutered": prp.neutered,
-        "chipped": prp.chipped,
-        "vaccinations": prp.vaccinations,
-        "pre_existing": prp.pre_existing,
-        "aggressive": prp.aggressive,
-        "is_pet_yours": prp.is_pet_yours,
-    } for prp in PET_RISK_PET_CACHE.values()])
-    print(f"✅ Loaded cache from PET_RISK_PET_CACHE: {(len(df_prp))} rows")
+    df_risk = df_risk.assign(copay=df_risk["copay"].fillna(2))
 
     # Assume Aggressive is FALSE where NULL
-    df_prp["aggressive"] = df_prp["aggressive"].fillna(False)
     # Assume prn = 1 where NULL
-    df_prp["prn"] = df_prp["prn"].fillna(1)
+    df_prp = df_prp.assign(
+        aggressive=df_prp["aggressive"].fillna(False),
+        prn=df_prp["prn"].fillna(1),
+    )
 
-    df_dld = pd.DataFrame([{
-        "dld_id": dld.defined_list_detail_id,
-        "dld_name": dld.dld_name,
-        "unique_id": dld.unique_id
-    } for dld in DEFINED_LIST_DETAIL_CACHE.values()])
-    print(f"✅ Loaded cache from DEFINED_LIST_DETAIL_CACHE: {(len(df_dld))} rows")
-    
+    df_dld = frames["dld"].copy()
     df_dld["Item"] = (
         df_dld["unique_id"]
         .str.split(".", n=1).str[0]
@@ -367,42 +552,24 @@ def re_rated_cache():
         .str.lower()
     )
 
-    df_pr = pd.DataFrame([{
-        "risk_id": pr.risk_id,
-        "pet_proposer_id": pr.pet_proposer_id,
-        "pet_cover_level_dldid": pr.pet_cover_level_dldid
-    } for pr in PET_RISK_CACHE.values()])
-    print(f"✅ Loaded cache from PET_RISK_CACHE: {(len(df_pr))} rows")
-    
-    df_pp = pd.DataFrame([{
-        "pet_proposer_id": pp.pet_proposer_id,
-        "address_id": pp.address_id,
-        "ph_dob": pp.ph_dob,
-        "uk_resident": pp.uk_resident,
-        "kept_at_address": pp.kept_at_address,
-        "trade_business": pp.trade_business
-    } for pp in PET_PROPOSER_CACHE.values()])
-    print(f"✅ Loaded cache from PET_PROPOSER_CACHE: {(len(df_pp))} rows")
+    df_pr = frames["pr"]
+    df_pp = frames["pp"]
 
     # Assume Trade/Business is FALSE where NULL
-    df_pp["trade_business"] = df_pp["trade_business"].fillna(False)
+    df_pp = df_pp.assign(trade_business=df_pp["trade_business"].fillna(False))
 
-    df_a = pd.DataFrame([{
-        "address_id": a.address_id,
-        "postcode": a.postcode
-    } for a in ADDRESS_CACHE.values()])
-    print(f"✅ Loaded cache from ADDRESS_CACHE: {(len(df_a))} rows")
+    df_a = frames["address"]
 
     # Pull in Cover Level Name and proposer info
     df_pr_merged = df_pr.merge(
-        df_dld[["dld_name", "dld_id"]], 
-        how="inner", 
-        left_on="pet_cover_level_dldid", 
+        df_dld[["dld_name", "dld_id"]],
+        how="inner",
+        left_on="pet_cover_level_dldid",
         right_on="dld_id"
     )
     df_pr_merged = df_pr_merged.merge(df_pp, how="inner", on="pet_proposer_id")
     df_pr_merged = df_pr_merged.merge(df_a, how="inner", on="address_id")
-    
+
     # Remove columns not required
     df_pr_merged = df_pr_merged[[
         "risk_id", "dld_name", "ph_dob", "postcode", "uk_resident", "kept_at_address","trade_business"
@@ -411,14 +578,14 @@ def re_rated_cache():
     # Map the DLD ID columns to readable "Item" types
     melted_prp = df_prp.melt(
         id_vars=[
-            "pet_risk_pet_id", 
-            "risk_id", 
+            "pet_risk_pet_id",
+            "risk_id",
             "prn",
             "pet_name",
             "pet_dob",
             "cost_of_pet",
-            "neutered", 
-            "aggressive", 
+            "neutered",
+            "aggressive",
             "pre_existing",
             "chipped",
             "vaccinations",
@@ -437,22 +604,22 @@ def re_rated_cache():
 
     # Join the DLD table to the PRP one
     melted_merge = melted_prp.merge(
-        df_dld, 
-        how="left", 
+        df_dld,
+        how="left",
         on="dld_id"
     )
 
     # Pivot the table
     pivoted_merge = melted_merge.pivot_table(
         index=[
-            "pet_risk_pet_id", 
+            "pet_risk_pet_id",
             "risk_id",
             "pet_name",
             "prn",
             "pet_dob",
             "cost_of_pet",
-            "neutered", 
-            "aggressive", 
+            "neutered",
+            "aggressive",
             "pre_existing",
             "chipped",
             "vaccinations",
@@ -463,17 +630,10 @@ def re_rated_cache():
         aggfunc="first"
     ).reset_index()
     pivoted_merge["pet_name"] = pivoted_merge["pet_name"].str.strip()
-    
+
 
     # Premium per pet
-    df_sqrc = pd.DataFrame([{
-        "scheme_quote_result_comment_id": sqrc.scheme_quote_result_comment_id,
-        "scheme_quote_result_id": sqrc.scheme_quote_result_id,
-        "comment_text": sqrc.comment_text,
-        "prem_per_pet": sqrc.premium_total,
-    } for sqrc in SCHEME_QUOTE_RESULT_COMMENT_CACHE.values()])
-
-    df_sqrc = df_sqrc[df_sqrc["comment_text"].str.contains("Belongs", case=False)]
+    df_sqrc = df_sqrc[df_sqrc["comment_text"].str.contains("Belongs", case=False)].copy()
     df_sqrc["pet_name"] = df_sqrc["comment_text"].str.extract(r"^(.*?)\s*Belongs to proposer", expand=False).str.strip()
     df_sqrc = df_sqrc[["scheme_quote_result_id", "pet_name", "prem_per_pet"]]
 
@@ -501,7 +661,7 @@ def re_rated_cache():
 
     # Multipet calc
     df_merged["max_prn"] = df_merged.groupby(["policy_number", "adjustment_number"])["prn"].transform("max")
-    df_merged["multipet"] = df_merged["max_prn"].apply(lambda x: "yes" if x > 1 else "no")
+    df_merged["multipet"] = np.where(df_merged["max_prn"] > 1, "yes", "no")
 
     # GWP per pet calc
     df_merged["total_combined_prem"] = df_merged.groupby(["policy_number", "adjustment_number"])["prem_per_pet"].transform("sum")
@@ -520,12 +680,7 @@ def re_rated_cache():
     df_merged["breed"] = df_merged["breed"].str.lower()
 
     # Add S/M/L to crossbreed
-    df_merged["breed"] = df_merged.apply(
-        lambda row: f"{row['breed']}: {row['sizeofpet'].split()[0]}"
-                    if row["breed"].lower() in ["crossbreed", "mongrel"]
-                    else row["breed"],
-        axis=1
-    ).str.lower()
+    df_merged["breed"] = crossbreed_breed(df_merged["breed"], df_merged["sizeofpet"])
 
     df_merged["copay"] = df_merged["copay"].map({1: "yes", 2: "no"})
     df_merged["neutered"] = df_merged["neutered"].map({True: "yes", False: "no"})
@@ -541,174 +696,422 @@ def re_rated_cache():
     df_merged["neutered_gender"] = (
         df_merged["gender"].astype(str) + ": " + df_merged["neutered"].astype(str)
     ).str.lower()
-    
+
     # Filter NB / REN only
     df_merged = df_merged[
-        (df_merged["transaction_name"] == "New Business") | 
-        (df_merged["transaction_name"] == "Renewal")  
-    ]
-
-    # Policyholder Age (Years)
-    df_merged["ph_age"] = df_merged.apply(
-        lambda x: x["effective_date"].year - x["ph_dob"].year,
-        axis = 1 
-    )
-    ph_bins = [0, 19.999, 29.999, 39.999, 49.999, 59.999, 69.999, 79.999, 89.999, float("inf")]
-    df_merged["ph_age"] = pd.cut(
-        df_merged["ph_age"], 
-        bins=ph_bins, 
-        labels=ph_age_order, 
-        right=True, 
-        include_lowest=True
-    )
-
-    # Pet Age in months
-    df_merged["pet_age_mnths"] = df_merged.apply(
-        lambda x: (x["effective_date"].year - x["pet_dob"].year) * 12 + (x["effective_date"].month - x["pet_dob"].month),
-        axis = 1 
-    )
-    df_merged["pet_age"] = df_merged["pet_age_mnths"]
-
-    # Pet Age & Gender
-    pet_bins_1 = [0, 50, 100, float("inf")]
-    pet_labels_1 = ["1\u201350", "51\u2013100", "101+"]
-    df_merged["pet_age_mnths"] = pd.cut(
-        df_merged["pet_age_mnths"], 
-        bins=pet_bins_1, 
-        labels=pet_labels_1, 
-        right=True, 
-        include_lowest=True
-    )
-    df_merged["pet_age_gender"] = (
-        df_merged["gender"].astype(str) + ": " + df_merged["pet_age_mnths"].astype(str)
-    ).str.lower()
-
-    # Pet Age in Months
-    pet_bins_2 = [
-        0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23,24,28,31,
-        34,37,40,43,46,48,54,60,66,72,78,84,90,96,102,108,114,120,126,132,138,
-        144,150,156,162,168,174,180,186,192,204,216,228,240,float("inf")
-    ]
-    df_merged["pet_age"] = pd.cut(
-        df_merged["pet_age"], 
-        bins=pet_bins_2, 
-        labels=pet_age_order, 
-        right=True, 
-        include_lowest=True
+        (df_merged["transaction_name"] == "New Business") |
+        (df_merged["transaction_name"] == "Renewal")
+    ].copy()
+
+    # Policyholder Age (Years), Pet Age (Months), Pet Age & Gender and Cost of Pet bands
+    add_banded_features(
+        df_merged,
+        ph_age=age_in_years(df_merged["effective_date"], df_merged["ph_dob"]),
+        pet_age_mnths=age_in_months(df_merged["effective_date"], df_merged["pet_dob"]),
+        gender=df_merged["gender"],
+        cost_of_pet=df_merged["cost_of_pet"],
     )
 
-    # Cost of Pet
-    pet_price_bins = [0, 75, 150, 300, 600, 1200, float("inf")]
-    df_merged["pet_price"] = pd.cut(
-        df_merged["cost_of_pet"],
-        bins = pet_price_bins,
-        labels = pet_price_order,
-        right=True,
-        include_lowest=True
-    )
+    # Exclude Champ policies for now
+    df_merged = df_merged[~df_merged["scheme"].str.contains("Champ", case=False, na=False)].copy()
 
-    # Fetch the rates
-    all_rates = PetRates.objects.all()
-    df_rates = pd.DataFrame(list(all_rates.values()))
-    print(f"✅ Loaded from PetRates{(len(df_rates))}")
-    df_rates["scheme"] = df_rates["scheme"].str.replace("_", " ")
-    df_rates = df_rates.rename(columns={"pet_type": "pettype"})
+    return df_merged
 
-    
-    # Exclude Champ policies for now
-    df_merged = df_merged[~df_merged["scheme"].str.contains("Champ", case=False, na=False)]
-    
-    # Debugging
-    if debug == "Yes":   
-        df_rates.to_csv(debugging_folder / "df_rates.csv", index=False)
-        df_merged.to_csv(debugging_folder / "df_merged.csv", index=False)
-    else:
-        None
-    
-    # Prepare base rates DataFrame
-    df_base_rates = df_rates[df_rates["factor"] == "base_rate"][["pettype", "scheme", "rate"]]
-    df_base_rates = df_base_rates.rename(columns={"rate": "base_rate"})
 
-    # Merge base rates
-    df_merged = df_merged.merge(df_base_rates, on=["pettype", "scheme"], how="left")
-    print("Base rates loaded for first 10 rows:")
-    print(df_merged[["pettype", "scheme", "base_rate"]].head(10))
+# -------------------------
+# Price df_merged
+# -------------------------
+# Price every row with the rate set in force at its effective date
+RATE_SET_IN_FORCE = "in_force"
 
-    # Prepare limits DataFrame
-    df_limits = df_rates[["pettype", "scheme", "limit"]].drop_duplicates()
-    
-    # Merge limits
-    df_merged = df_merged.merge(df_limits, on=["pettype", "scheme"], how="left")
-    print("Limit loaded for first 10 rows:")
-    print(df_merged[["pettype", "scheme", "limit"]].head(10))
 
+def price_policy_frame(df_merged, rate_set=None):
+    """
+    Look up base rate, limit and every factor for df_merged in place, then add
+    re_rated_gwp_per_pet, decline_flag and rate_set_id (the RateSet that priced
+    the row, blank for the working rates).
+    rate_set: None for the working rates, a RateSet id, or RATE_SET_IN_FORCE to
+    price each row with the rate set in force at its effective_date. Rows with
+    no rate set in force (dated before the first one, or no effective_date) are
+    left unpriced: their rates and re_rated_gwp_per_pet are NaN, decline_flag is N.
+    """
     factors = [
         "pet_age_gender", "pet_age", "pet_price", "neutered_gender", "chipped",
         "vaccinations", "pre_existing", "aggressive", "is_pet_yours", "postcode",
         "uk_resident", "kept_at_address", "trade_business", "ph_age", "copay", "multipet"
     ]
 
-    # Handle breed separately because it depends on pet type
-    breed_mask = df_rates["factor"].isin(["dog_breed", "cat_breed"])
-    df_breed_rates = df_rates[breed_mask].rename(columns={"option": "breed", "rate": "breed_factor"})
-    df_breed_rates = df_breed_rates[["pettype", "scheme", "breed", "breed_factor"]]
+    # Look up base rate, limit and every factor in place from the compiled rate arrays
+    # (breed first, as it depends on pet type - dog_breed / cat_breed)
+    unpriced = np.zeros(len(df_merged), dtype=bool)
+    if isinstance(rate_set, str) and rate_set == RATE_SET_IN_FORCE:
+        rate_set = rate_sets_in_force(df_merged["effective_date"])
+        unpriced = pd.isna(rate_set)
+        if unpriced.any():
+            print(f"⚠️ {int(unpriced.sum())} rows have no rate set in force at their effective_date — left unpriced")
+    apply_rates(df_merged, ["breed"] + factors, pet_type_col="pettype", scheme_col="scheme", rate_set=rate_set)
+    print("Base rates and limits loaded for first 10 rows:")
+    print(df_merged[["pettype", "scheme", "base_rate", "limit"]].head(10))
 
-    # Merge breed factor
-    df_merged = df_merged.merge(df_breed_rates, how="left", on=["pettype", "scheme", "breed"])
     # Set factor to 999 and assume decline for breeds that cannot be matched to rating guide
     df_merged["breed_factor"] = df_merged["breed_factor"].fillna(999)
-    print("✅ Breed factor loaded.")
-
-    # Now handle remaining factors
-    for factor in factors:
-        df_factor = df_rates[df_rates["factor"] == factor].rename(
-            columns={"option": factor, "rate": f"{factor}_factor"}
-        )
-        df_factor = df_factor[["pettype", "scheme", factor, f"{factor}_factor"]]
-        df_merged = df_merged.merge(df_factor, how="left", on=["pettype", "scheme", factor])
-        print(f"✅ {factor}_factor loaded.")
+    print("✅ Rating factors loaded.")
 
     # Quick check: show first few rows
     debug_cols = ["pettype", "scheme", "breed"] + [f"{factor}_factor" for factor in factors] + ["breed_factor"]
     print(df_merged[debug_cols].head(10))
 
-    df_merged["re_rated_gwp_per_pet"] = df_merged.eval(
-        "base_rate * pet_age_factor * pet_age_gender_factor * breed_factor * pet_price_factor *"
-        "neutered_gender_factor * chipped_factor * vaccinations_factor * pre_existing_factor *"
-        "aggressive_factor * is_pet_yours_factor * postcode_factor * uk_resident_factor *"
-        "kept_at_address_factor * trade_business_factor * ph_age_factor * copay_factor * multipet_factor"
+    factor_cols = [f"{f}_factor" for f in factors] + ["breed_factor"]
+    if unpriced.any():
+        df_merged.loc[unpriced, ["base_rate", "limit"] + factor_cols] = np.nan
+
+    df_merged["re_rated_gwp_per_pet"] = df_merged.eval(PREMIUM_FORMULA)
+    df_merged["decline_flag"] = df_merged[factor_cols].eq(999).any(axis=1).map({True: "Y", False: "N"})
+    df_merged["rate_set_id"] = pd.array(
+        np.broadcast_to(np.asarray(rate_set, dtype=object), len(df_merged)), dtype="Int64"
     )
 
-    factor_cols = [f"{f}_factor" for f in factors] + ["breed_factor"]
-    df_merged["decline_flag"] = df_merged[factor_cols].eq(999).any(axis=1).map({True: "Y", False: "N"}) 
+    return df_merged
+
+
+# -------------------------
+# Incremental re-rating
+# -------------------------
+# Alongside df_merged.parquet we keep a fingerprint of every policy's source rows
+# and a snapshot of PetRates, so the next run only rebuilds policies whose inputs
+# changed and only re-prices rows that use a changed rate.
+RE_RATED_INPUTS_FILE = output_folder / "re_rated_inputs.parquet"
+RE_RATED_RATES_FILE = output_folder / "re_rated_rates.parquet"
+
+# Fingerprint row for the lookup tables every policy depends on (TransactionType, DefinedListDetail)
+SHARED_INPUTS_ID = -1
+
+RATE_KEY_COLS = ["pet_type", "scheme", "factor", "option"]
+
+
+def _row_hashes(df, key, policy_keys=None):
+    """(policy_master_id, input_hash) per source row, mapped to policies through policy_keys."""
+    hashes = pd.DataFrame({
+        key: df[key].to_numpy(),
+        "input_hash": pd.util.hash_pandas_object(df, index=False).to_numpy(),
+    })
+    if policy_keys is not None:
+        hashes = hashes.merge(policy_keys, on=key)
+    return hashes[["policy_master_id", "input_hash"]]
+
+
+def policy_input_hashes(frames):
+    """
+    One uint64 fingerprint per policy_master_id over every source row its re-rate reads:
+    PolicyMaster, PolicyHistory, Risk, PetRiskPet, PetRisk, PetProposer, Address and
+    SchemeQuoteResultComment. Shared lookup tables are fingerprinted under SHARED_INPUTS_ID.
+    """
+    history = frames["history"]
+    policy_risks = history[["policy_master_id", "risk_id"]].drop_duplicates()
+    policy_quotes = history[["policy_master_id", "scheme_quote_result_id"]].drop_duplicates()
+    policy_proposers = policy_risks.merge(
+        frames["pr"][["risk_id", "pet_proposer_id"]], on="risk_id"
+    )[["policy_master_id", "pet_proposer_id"]].drop_duplicates()
+    policy_addresses = policy_proposers.merge(
+        frames["pp"][["pet_proposer_id", "address_id"]], on="pet_proposer_id"
+    )[["policy_master_id", "address_id"]].drop_duplicates()
+
+    parts = [
+        _row_hashes(frames["master"], "policy_master_id"),
+        _row_hashes(history, "policy_master_id"),
+        _row_hashes(frames["risk"], "risk_id", policy_risks),
+        _row_hashes(frames["prp"], "risk_id", policy_risks),
+        _row_hashes(frames["pr"], "risk_id", policy_risks),
+        _row_hashes(frames["pp"], "pet_proposer_id", policy_proposers),
+        _row_hashes(frames["address"], "address_id", policy_addresses),
+        _row_hashes(frames["sqrc"], "scheme_quote_result_id", policy_quotes),
+    ]
+    for name in ("tt", "dld"):
+        parts.append(pd.DataFrame({
+            "policy_master_id": SHARED_INPUTS_ID,
+            "input_hash": pd.util.hash_pandas_object(frames[name], index=False).to_numpy(),
+        }))
+
+    # Row hashes are summed (uint64, wrapping) so row order does not matter
+    return (
+        pd.concat(parts, ignore_index=True)
+        .groupby("policy_master_id", as_index=False)["input_hash"].sum()
+    )
+
+
+def changed_policies(previous, current):
+    """policy_master_ids that are new, removed or whose fingerprint differs."""
+    old = previous.set_index("policy_master_id")["input_hash"]
+    new = current.set_index("policy_master_id")["input_hash"]
+    both = new.index.intersection(old.index)
+    changed = both[old.loc[both].to_numpy() != new.loc[both].to_numpy()]
+    return changed.union(new.index.difference(old.index)).union(old.index.difference(new.index))
+
+
+def rates_snapshot():
+    """The working PetRates rows as a DataFrame (last row wins per key, as in the compiled rate table)."""
+    rows = PetRates.objects.filter(rate_set=None).order_by("id").values_list(*RATE_KEY_COLS, "rate", "limit")
+    df_rates = pd.DataFrame(list(rows), columns=RATE_KEY_COLS + ["rate", "limit"])
+    df_rates["pet_type"] = df_rates["pet_type"].str.strip().str.lower()
+    df_rates["scheme"] = df_rates["scheme"].str.strip().str.lower().str.replace(" ", "_")
+    df_rates["option"] = df_rates["option"].replace("", None)
+    return df_rates.drop_duplicates(RATE_KEY_COLS, keep="last").reset_index(drop=True)
+
+
+def changed_rates(previous, current):
+    """PetRates keys that were added, removed or whose rate / limit changed."""
+    merged = previous.merge(
+        current, how="outer", on=RATE_KEY_COLS, suffixes=("_old", "_new"), indicator=True
+    )
+
+    def differs(col):
+        old, new = merged[f"{col}_old"], merged[f"{col}_new"]
+        return ~((old == new) | (old.isna() & new.isna()))
+
+    changed = (merged["_merge"] != "both") | differs("rate") | differs("limit")
+    return merged.loc[changed, RATE_KEY_COLS]
+
+
+def rows_using_rates(df_merged, rate_keys):
+    """Boolean mask of df_merged rows priced with any of the given PetRates keys."""
+    pet_type = df_merged["pettype"].astype(object)
+    scheme = df_merged["scheme"].astype(object).str.replace(" ", "_")
+    mask = np.zeros(len(df_merged), dtype=bool)
+
+    # Base rate / limit rows touch every policy on the pet type / scheme
+    whole_scheme = rate_keys["option"].isna()
+    if whole_scheme.any():
+        keys = rate_keys[whole_scheme]
+        mask |= pd.MultiIndex.from_arrays([pet_type, scheme]).isin(
+            list(zip(keys["pet_type"], keys["scheme"]))
+        )
+
+    for factor, keys in rate_keys[~whole_scheme].groupby("factor"):
+        column = "breed" if factor.endswith("_breed") else factor
+        if column not in df_merged.columns:
+            continue
+        mask |= pd.MultiIndex.from_arrays([pet_type, scheme, df_merged[column].astype(object)]).isin(
+            list(zip(keys["pet_type"], keys["scheme"], keys["option"]))
+        )
+
+    return mask
+
+
+# -------------------------
+# Build DF_MERGED_CACHE
+# -------------------------
+def re_rated_cache(incremental=False, rate_set=None):
+    """
+    Build the final df_merged DataFrame and store it in RE_RATED_CACHE.
+    With incremental=True the previous parquet is reused: only policies whose
+    source rows changed are rebuilt, and only rows using a changed rate are
+    re-priced. Falls back to a full build when there is no previous run.
+    rate_set is passed to price_policy_frame (None = working rates); only runs
+    on the working rates can be incremental.
+    """
+    global RE_RATED_CACHE, _RE_RATED_STATE
+
+    # Make sure the base caches are loaded
+    load_static_cache()
+
+    frames = static_frames()
+    input_hashes = policy_input_hashes(frames)
+    df_rates = rates_snapshot()
+    print(f"✅ Loaded from PetRates{(len(df_rates))}")
+
+    previous = None
+    if incremental and rate_set is not None:
+        print("⚠️ Incremental re-rating only tracks the working rates — running a full rebuild.")
+    elif incremental and (read_re_rated_meta() or {}).get("rate_set") is not None:
+        print("⚠️ Previous re-rate used another rate set — running a full rebuild.")
+    elif incremental:
+        if RE_RATED_MANIFEST.exists() and RE_RATED_INPUTS_FILE.exists() and RE_RATED_RATES_FILE.exists():
+            previous = read_re_rated()
+            previous_hashes = pd.read_parquet(RE_RATED_INPUTS_FILE)
+            previous_rates = pd.read_parquet(RE_RATED_RATES_FILE)
+        else:
+            print("⚠️ No previous re-rate found — running a full rebuild.")
+
+    if previous is not None:
+        changed_ids = changed_policies(previous_hashes, input_hashes)
+        if SHARED_INPUTS_ID in changed_ids:
+            print("⚠️ Transaction types / defined lists changed — running a full rebuild.")
+            previous = None
+
+    if previous is None:
+        df_merged = price_policy_frame(build_policy_frame(frames), rate_set)
+    else:
+        # Rows of unchanged policies are kept; re-price those that use a changed rate
+        df_merged = previous[~previous["policy_master_id"].isin(changed_ids)]
+        rate_keys = changed_rates(previous_rates, df_rates)
+        repriced = rows_using_rates(df_merged, rate_keys)
+        print(f"🔄 {len(rate_keys)} rates changed — re-pricing {int(repriced.sum())} rows")
+        if repriced.any():
+            df_merged = pd.concat(
+                [df_merged[~repriced], price_policy_frame(df_merged[repriced].copy())],
+                ignore_index=True,
+            )
+
+        # Rebuild new / changed policies (removed ones are simply dropped)
+        rebuild_ids = changed_ids.intersection(frames["master"]["policy_master_id"])
+        print(f"🔄 {len(changed_ids)} policies changed — rebuilding {len(rebuild_ids)}")
+        if len(rebuild_ids):
+            rebuilt = price_policy_frame(build_policy_frame(frames, rebuild_ids))
+            df_merged = pd.concat([df_merged, rebuilt], ignore_index=True)
 
     df_merged["re_rated_gwp_per_pol"] = df_merged.groupby(
         ["policy_number", "adjustment_number"]
         )["re_rated_gwp_per_pet"].transform("sum")
-    # --------------------------------------------------
-    # Export to CSV
-    df_merged.to_csv(r'C:\Users\jorda\OneDrive - Only Pets Cover Limited\Desktop\df_merged_export.csv', index=False)
-    
+
+    # Debugging
+    if debug == "Yes":
+        df_rates.to_csv(debugging_folder / "df_rates.csv", index=False)
+        df_merged.to_csv(debugging_folder / "df_merged.csv", index=False)
+    else:
+        None
+    # (Exports are streamed from the dataset: rates/re_rated_policies/export/)
+
     RE_RATED_CACHE = df_merged
 
     # Save to parquet for persistence
     if RE_RATED_CACHE is not None:
-        RE_RATED_CACHE.to_parquet(RE_RATED_FILE, index=False)
-        print(f"✅ Exported df_merged to {RE_RATED_FILE}")
+        write_partitioned(RE_RATED_DATASET, RE_RATED_CACHE, RE_RATED_PARTITIONING)
+        _RE_RATED_STATE = (_file_stamp(RE_RATED_MANIFEST), RE_RATED_CACHE)
+        write_re_rated_meta(RE_RATED_CACHE, incremental=previous is not None, rate_set=rate_set)
+        build_rate_index_cube(RE_RATED_CACHE).to_parquet(RE_RATED_CUBE_FILE, index=False)
+        input_hashes.to_parquet(RE_RATED_INPUTS_FILE, index=False)
+        df_rates.to_parquet(RE_RATED_RATES_FILE, index=False)
+        print(f"✅ Exported df_merged to {RE_RATED_DATASET}")
 
 # -------------------------
 # Load DF_MERGED_CACHE from disk
 # -------------------------
+# (file stamp, DataFrame) the cache was read from, swapped in whole, and
+# hit / miss counts for load_re_rated_cache().
+_RE_RATED_STATE = (None, None)
+_RE_RATED_LOCK = threading.Lock()
+RE_RATED_CACHE_STATS = {"hits": 0, "misses": 0}
+
+
+def _file_stamp(path):
+    """
+    (inode, mtime, size) of a file, None if it does not exist. Files are
+    swapped in whole (a dataset by its manifest), so the stamp changes with every write.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def write_re_rated_meta(df_merged, incremental=False, rate_set=None):
+    """
+    Write the sidecar describing the re-rated dataset: build time, rating guide,
+    rate set, row count and the distinct inception months with their row counts.
+    """
+    rows_per_month = df_merged["inception_month"].value_counts().sort_index()
+    meta = {
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "rating_guide": PureWindowsPath(rating_guide).name,
+        "incremental": incremental,
+        "rate_set": rate_set,
+        "rows": len(df_merged),
+        "months": [float(month) for month in rows_per_month.index],
+        "rows_per_month": {str(float(month)): int(rows) for month, rows in rows_per_month.items()},
+    }
+    tmp_path = RE_RATED_META_FILE.with_name(f"{RE_RATED_META_FILE.name}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=4)
+    os.replace(tmp_path, RE_RATED_META_FILE)
+    return meta
+
+
+def build_rate_index_cube(df_merged):
+    """
+    GWP and re-rated GWP (and row counts) summed over every combination of
+    RATE_INDEX_DIMENSIONS, so rate-index reports never have to scan the policies.
+    """
+    cube = (
+        df_merged.groupby(RATE_INDEX_DIMENSIONS, observed=True, dropna=False)
+        .agg(
+            gwp_per_pet=("gwp_per_pet", "sum"),
+            re_rated_gwp_per_pet=("re_rated_gwp_per_pet", "sum"),
+            rows=("re_rated_gwp_per_pet", "size"),
+        )
+        .reset_index()
+    )
+    # Low-cardinality labels as categoricals keep the cube small in memory and on disk
+    for col in RATE_INDEX_DIMENSIONS[1:]:
+        cube[col] = cube[col].astype("category")
+    return cube
+
+
+def read_re_rated_meta():
+    """The re-rated dataset's sidecar metadata, None if it has not been built."""
+    try:
+        with open(RE_RATED_META_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_re_rated(columns=None, filters=None):
+    """
+    Read the re-rated policies, optionally only some columns and the rows matching
+    filters ([(column, op, value), ...]). Filters on transaction_name and
+    inception_month only open the matching partitions.
+    """
+    return read_partitioned(RE_RATED_DATASET, RE_RATED_PARTITIONING, columns, filters)
+
+
+def iter_re_rated(columns=None, filters=None, batch_size=50_000):
+    """Stream the re-rated policies as pyarrow RecordBatches (same columns / filters as read_re_rated)."""
+    return iter_partitioned(RE_RATED_DATASET, RE_RATED_PARTITIONING, columns, filters, batch_size)
+
+
+def count_re_rated(filters=None):
+    """Number of re-rated policy rows matching filters, without reading them."""
+    return count_partitioned(RE_RATED_DATASET, RE_RATED_PARTITIONING, filters)
+
+
+def re_rated_schema(columns=None):
+    """Columns and types of the re-rated dataset (as streamed by iter_re_rated)."""
+    return dataset_schema(RE_RATED_DATASET, RE_RATED_PARTITIONING, columns)
+
+
 def load_re_rated_cache():
     """
-    Load DF_MERGED_CACHE from parquet file if it exists.
+    Load RE_RATED_CACHE from the re-rated dataset, re-reading it only when it
+    has been rebuilt. The DataFrame is shared by every caller in the process,
+    so treat it as read-only. Readers that need only some columns or months
+    should use read_re_rated() instead.
     """
-    global RE_RATED_CACHE
-    if RE_RATED_FILE.exists():
-        RE_RATED_CACHE = pd.read_parquet(RE_RATED_FILE)
-        print(f"✅ Loaded re rated from {RE_RATED_FILE}, rows: {len(RE_RATED_CACHE)}")
-    else:
-        print("⚠️ df_merged.parquet not found — run build_re_rated_policies_cache() first.")
+    global RE_RATED_CACHE, _RE_RATED_STATE
+
+    stamp = _file_stamp(RE_RATED_MANIFEST)
+    if stamp is None:
+        print("⚠️ Re-rated dataset not found — run re_rated_cache() first.")
+        return RE_RATED_CACHE
+
+    cached_stamp, df = _RE_RATED_STATE
+    if df is not None and cached_stamp == stamp:
+        RE_RATED_CACHE_STATS["hits"] += 1
+        RE_RATED_CACHE = df
+        return df
+
+    with _RE_RATED_LOCK:
+        cached_stamp, df = _RE_RATED_STATE
+        if df is None or cached_stamp != stamp:
+            RE_RATED_CACHE_STATS["misses"] += 1
+            df = read_re_rated()
+            _RE_RATED_STATE = (stamp, df)
+            print(f"✅ Loaded re rated from {RE_RATED_DATASET}, rows: {len(df)}")
+        else:
+            RE_RATED_CACHE_STATS["hits"] += 1
+
+    RE_RATED_CACHE = df
+    return df
 
 
 # -------------------------
@@ -724,26 +1127,9 @@ def quote_data():
 
     # FORMATTING RATING FACTORS
     # Add S/M/L to crossbreed
-    def compute_breed(row):
-        pet_type = str(row.get("PetType", "")).lower()
-        pet_subtype = str(row.get("PetSubType", "")).lower()
-        breed = str(row.get("BreedName", "")).lower()
-        size = str(row.get("Size", "")).lower()
-
-        if pet_subtype == "moggie":
-            return pet_subtype
-        elif pet_type == "cat":
-            return breed
-        elif pet_subtype in ["crossbreed", "mongrel"]:
-            return f"{pet_subtype}: {size}"
-        elif "mongrel" in breed:
-            return f"mongrel: {size}"
-        elif "crossbreed" in breed:
-            return f"crossbreed: {size}"
-        else:
-            return breed
-
-    df_quotes["breed"] = df_quotes.apply(compute_breed, axis=1)
+    df_quotes["breed"] = quote_breed(
+        df_quotes["PetType"], df_quotes["PetSubType"], df_quotes["BreedName"], df_quotes["Size"]
+    )
     df_quotes["gender"] = df_quotes["GenderInstepCode"].map({"M": "male", "F": "female"})
 
     df_quotes["postcode"] = (
@@ -765,68 +1151,19 @@ def quote_data():
     df_quotes["trade_business"] = "no"
 
     df_quotes["no_of_pets"] = df_quotes["SourceFile"].map(df_quotes["SourceFile"].value_counts())
-    df_quotes["multipet"] = df_quotes["no_of_pets"].apply(lambda x: "yes" if x > 1 else "no")
+    df_quotes["multipet"] = np.where(df_quotes["no_of_pets"] > 1, "yes", "no")
 
     df_quotes["neutered_gender"] = (
         df_quotes["gender"].astype(str) + ": " + df_quotes["neutered"].astype(str)
         ).str.lower()
 
-    # Policyholder Age (Years)
-    ph_bins = [0, 19.999, 29.999, 39.999, 49.999, 59.999, 69.999, 79.999, 89.999, float("inf")]
-    df_quotes["ph_age"] = pd.cut(
-        df_quotes["ProposerAgeYears"], 
-        bins=ph_bins, 
-        labels=ph_age_order, 
-        right=True, 
-        include_lowest=True
-    )
-
-    # Pet Age in months
-    df_quotes["pet_age_mnths"] = df_quotes.apply(
-        lambda x: (
-            pd.to_datetime(x["CoverStartDateTime"]).year - pd.to_datetime(x["PetDOB"]).year
-        ) * 12
-        + (pd.to_datetime(x["CoverStartDateTime"]).month - pd.to_datetime(x["PetDOB"]).month),
-        axis=1
-    )
-    df_quotes["pet_age"] = df_quotes["pet_age_mnths"]
-
-    # Pet Age & Gender
-    pet_bins_1 = [0, 50, 100, float("inf")]
-    pet_labels_1 = ["1\u201350", "51\u2013100", "101+"]
-    df_quotes["pet_age_mnths"] = pd.cut(
-        df_quotes["pet_age_mnths"], 
-        bins=pet_bins_1, 
-        labels=pet_labels_1, 
-        right=True, 
-        include_lowest=True
-    )
-    df_quotes["pet_age_gender"] = (
-        df_quotes["gender"].astype(str) + ": " + df_quotes["pet_age_mnths"].astype(str)
-    ).str.lower()
-
-    # Pet Age in Months
-    pet_bins_2 = [
-        0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23,24,28,31,
-        34,37,40,43,46,48,54,60,66,72,78,84,90,96,102,108,114,120,126,132,138,
-        144,150,156,162,168,174,180,186,192,204,216,228,240,float("inf")
-    ]
-    df_quotes["pet_age"] = pd.cut(
-        df_quotes["pet_age"], 
-        bins=pet_bins_2, 
-        labels=pet_age_order, 
-        right=True, 
-        include_lowest=True
-    )
-
-    # Cost of Pet
-    pet_price_bins = [0, 75, 150, 300, 600, 1200, float("inf")]
-    df_quotes["pet_price"] = pd.cut(
-        df_quotes["CostOfPet"],
-        bins = pet_price_bins,
-        labels = pet_price_order,
-        right=True,
-        include_lowest=True
+    # Policyholder Age (Years), Pet Age (Months), Pet Age & Gender and Cost of Pet bands
+    add_banded_features(
+        df_quotes,
+        ph_age=df_quotes["ProposerAgeYears"],
+        pet_age_mnths=age_in_months(df_quotes["CoverStartDateTime"], df_quotes["PetDOB"]),
+        gender=df_quotes["gender"],
+        cost_of_pet=df_quotes["CostOfPet"],
     )
 
     # Pet Type
@@ -846,7 +1183,7 @@ def quote_data():
     ] = "cat"
 
     # Fetch Rates
-    all_rates = PetRates.objects.all()
+    all_rates = PetRates.objects.filter(rate_set=None)
     df_rates = pd.DataFrame(list(all_rates.values()))
     print(df_rates)
 
@@ -867,21 +1204,8 @@ def quote_data():
         "uk_resident", "kept_at_address", "trade_business", "ph_age", "multipet"
     ]
 
-    # Handle breed separately because it depends on pet type
-    breed_mask = df_rates["factor"].isin(["dog_breed", "cat_breed"])
-    breed_rates = df_rates[breed_mask].rename(columns={"option": "breed", "rate": "breed_factor"})
-    breed_rates = breed_rates[["pet_type", "scheme", "breed", "breed_factor"]]
-
-    # Merge breed factor
-    melted_quotes = melted_quotes.merge(breed_rates, how="left", on=["pet_type", "scheme", "breed"])
-
-    # Now handle remaining factors
-    for factor in factors:
-        df_factor = df_rates[df_rates["factor"] == factor].rename(
-            columns={"option": factor, "rate": f"{factor}_factor"}
-        )
-        df_factor = df_factor[["pet_type", "scheme", factor, f"{factor}_factor"]]
-        melted_quotes = melted_quotes.merge(df_factor, how="left", on=["pet_type", "scheme", factor])
+    # Look up breed (depends on pet type) and the remaining factors in place
+    apply_rates(melted_quotes, ["breed"] + factors, pet_type_col="pet_type", scheme_col="scheme", base_rate=False)
 
     # Copay
     copay_rates = df_rates[
@@ -894,12 +1218,7 @@ def quote_data():
     melted_quotes = melted_quotes.merge(copay_rates, how="left", on=["pet_type", "scheme"])
 
     # Prem Calc
-    melted_quotes["quoted_gwp"] = melted_quotes.eval(
-        "base_rate * pet_age_factor * pet_age_gender_factor * breed_factor * pet_price_factor *"
-        "neutered_gender_factor * chipped_factor * vaccinations_factor * pre_existing_factor *"
-        "aggressive_factor * is_pet_yours_factor * postcode_factor * uk_resident_factor *"
-        "kept_at_address_factor * trade_business_factor * ph_age_factor * copay_factor * multipet_factor"
-    )
+    melted_quotes["quoted_gwp"] = melted_quotes.eval(PREMIUM_FORMULA)
 
     melted_quotes["scheme_copay"] = (
         melted_quotes["scheme"].astype(str) + "_" + melted_quotes["copay"].astype(str)
@@ -0,0 +1,209 @@
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# -------------------------
+# Columnar table store
+# -------------------------
+# A folder with one Parquet file per table plus manifest.json describing them:
+#   {"saved_at": ..., "generation": ..., "meta": {...},
+#    "tables": {name: {"file", "rows", "columns": {col: dtype}}}}
+# Every save writes a new generation of files (<name>.<generation>.parquet) and
+# publishes them all at once by replacing the manifest.
+# Tables are read on demand, memory-mapped, and only for the columns asked for.
+MANIFEST_NAME = "manifest.json"
+
+
+def write_store(folder, tables, meta=None):
+    """
+    Write {name: DataFrame} as a new generation of <name>.<generation>.parquet
+    files, then publish them together by replacing the manifest, so readers
+    never mix tables from two saves. Files of the previous generation are kept
+    for readers still on it; older ones are removed.
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    previous = read_manifest(folder)
+    generation = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    manifest = {
+        "saved_at": datetime.now(timezone.utc).isoformat(),
+        "generation": generation,
+        "meta": meta or {},
+        "tables": {},
+    }
+
+    for name, df in tables.items():
+        file_name = f"{name}.{generation}.parquet"
+        df.to_parquet(folder / file_name, index=False)
+        manifest["tables"][name] = {
+            "file": file_name,
+            "rows": len(df),
+            "columns": {col: str(dtype) for col, dtype in df.dtypes.items()},
+        }
+
+    tmp_path = folder / f"{MANIFEST_NAME}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, folder / MANIFEST_NAME)
+
+    keep = {MANIFEST_NAME, *(entry["file"] for entry in manifest["tables"].values())}
+    if previous:
+        keep.update(entry["file"] for entry in previous["tables"].values())
+    for path in folder.glob("*.parquet"):
+        if path.name not in keep:
+            path.unlink(missing_ok=True)
+    return manifest
+
+
+def read_manifest(folder):
+    """The store's manifest, or None if nothing has been saved there."""
+    try:
+        with open(folder / MANIFEST_NAME) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_table(folder, name, columns=None, manifest=None):
+    """
+    Read one table from the store, optionally only some of its columns.
+    Returns None if the table is not in the store.
+    """
+    manifest = manifest or read_manifest(folder)
+    entry = manifest and manifest["tables"].get(name)
+    if entry is None:
+        return None
+
+    return pd.read_parquet(folder / entry["file"], columns=columns, memory_map=True)
+
+
+# -------------------------
+# Partitioned datasets
+# -------------------------
+# A large table written as a hive-partitioned Parquet dataset
+# (e.g. transaction_name=Renewal/inception_month=2025.07/part-0.parquet), so
+# readers filtering on the partition columns only open matching files and the
+# row-group statistics skip the rest.
+# Each write goes to a new generation folder inside the dataset folder and is
+# published by replacing manifest.json ({"saved_at", "generation", "rows"}),
+# so readers always see one complete generation.
+
+def partitioning(schema):
+    """Hive partitioning over [(column, pyarrow type), ...] (types are fixed, not inferred)."""
+    return ds.partitioning(pa.schema(schema), flavor="hive")
+
+
+def current_dataset(folder):
+    """Folder of the dataset's published generation, None if nothing has been written."""
+    manifest = read_manifest(folder)
+    return manifest and folder / manifest["generation"]
+
+
+def write_partitioned(folder, df, partitions, max_rows_per_group=100_000):
+    """
+    Write df as a new generation of the dataset and publish it. The previous
+    generation is kept for readers still on it; older ones are removed.
+    An empty df is written as one empty file, so the schema is still readable.
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    previous = read_manifest(folder)
+    generation = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if len(df):
+        ds.write_dataset(
+            table,
+            folder / generation,
+            format="parquet",
+            partitioning=partitions,
+            max_rows_per_group=max_rows_per_group,
+            max_rows_per_file=max_rows_per_group * 10,
+        )
+    else:
+        # Partition columns with the partitioning's types, as a non-empty write stores them
+        for field in partitions.schema:
+            i = table.schema.get_field_index(field.name)
+            table = table.set_column(i, field, table.column(i).cast(field.type))
+        (folder / generation).mkdir()
+        pq.write_table(table, folder / generation / "part-0.parquet")
+
+    manifest = {
+        "saved_at": datetime.now(timezone.utc).isoformat(),
+        "generation": generation,
+        "rows": len(df),
+    }
+    tmp_path = folder / f"{MANIFEST_NAME}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, folder / MANIFEST_NAME)
+
+    keep = {MANIFEST_NAME, generation, previous and previous["generation"]}
+    for path in folder.iterdir():
+        if path.name not in keep:
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+    return manifest
+
+
+def _open_dataset(folder, partitions):
+    path = current_dataset(folder)
+    if path is None:
+        raise FileNotFoundError(f"No dataset published in {folder}")
+    return ds.dataset(path, format="parquet", partitioning=partitions)
+
+
+def read_partitioned(folder, partitions, columns=None, filters=None):
+    """
+    Read a partitioned dataset, optionally only some columns and the rows matching
+    filters ([(column, op, value), ...] as for pd.read_parquet). Filters on
+    partition columns prune whole files; others use the row-group statistics.
+    """
+    dataset = _open_dataset(folder, partitions)
+    table = dataset.to_table(
+        columns=_dataset_columns(dataset, columns),
+        filter=pq.filters_to_expression(filters) if filters else None,
+    )
+    return table.to_pandas()
+
+
+def iter_partitioned(folder, partitions, columns=None, filters=None, batch_size=50_000):
+    """
+    Stream a partitioned dataset as pyarrow RecordBatches of at most batch_size
+    rows (same columns / filters as read_partitioned), reading one file's row
+    groups at a time so memory stays bounded however large the dataset is.
+    """
+    dataset = _open_dataset(folder, partitions)
+    yield from dataset.to_batches(
+        columns=_dataset_columns(dataset, columns),
+        filter=pq.filters_to_expression(filters) if filters else None,
+        batch_size=batch_size,
+        batch_readahead=1,
+        fragment_readahead=1,
+    )
+
+
+def count_partitioned(folder, partitions, filters=None):
+    """Rows of a partitioned dataset matching filters, counted from file metadata where possible."""
+    dataset = _open_dataset(folder, partitions)
+    return dataset.count_rows(filter=pq.filters_to_expression(filters) if filters else None)
+
+
+def dataset_schema(folder, partitions, columns=None):
+    """The pyarrow schema batches from iter_partitioned will have."""
+    dataset = _open_dataset(folder, partitions)
+    schema = dataset.schema
+    return pa.schema([schema.field(col) for col in _dataset_columns(dataset, columns) or schema.names])
+
+
+def _dataset_columns(dataset, columns):
+    if columns is None and dataset.schema.pandas_metadata:
+        # Partition columns come back last; restore the order the frame was written in
+        written = [col["name"] for col in dataset.schema.pandas_metadata["columns"]]
+        columns = [col for col in written if col in dataset.schema.names]
+    return columns
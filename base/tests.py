@@ -1,3 +1,803 @@
+from datetime import date, datetime, timezone
+import math
+import random
+import tempfile
+from pathlib import Path
+import pandas as pd
+from django.db import connections, models
 from django.test import TestCase
+from django.urls import reverse
+from django.test.utils import CaptureQueriesContext
+from base import static_data
+from base.pricing import PREMIUM_FORMULA, RATING_FACTORS, quote_premium, risk_options
+from base.models import (
+    PolicyMaster, PolicyHistory, Risk, TransactionType, PetRiskPet,
+    DefinedListDetail, PetRisk, PetProposer, Address, SchemeQuoteResultComment,
+    PetRates, RateSet,
+)
+from base.rate_table import invalidate_rate_table, rate_set_on, rate_sets_in_force
+from base.rating_engine import price_risks
+from base.static_store import read_partitioned, write_partitioned
+from base.utils import parse_rates_excel, publish_rate_set, save_nested_rates_to_db
 
-# Create your tests here.
+# Run with: python manage.py test base --settings=dtest.test_settings
+
+
+# -------------------------
+# Static data delta sync (SQLite in place of MSSQL)
+# -------------------------
+POLICY_MODELS = [
+    PolicyMaster, PolicyHistory, Risk, TransactionType, PetRiskPet,
+    DefinedListDetail, PetRisk, PetProposer, Address, SchemeQuoteResultComment,
+]
+
+# Cache attribute in static_data per model
+CACHE_NAMES = {
+    PolicyMaster: "POLICY_MASTER_CACHE",
+    PolicyHistory: "POLICY_HISTORY_CACHE",
+    Risk: "RISK_CACHE",
+    TransactionType: "TRANSACTION_TYPE_CACHE",
+    PetRiskPet: "PET_RISK_PET_CACHE",
+    DefinedListDetail: "DEFINED_LIST_DETAIL_CACHE",
+    PetRisk: "PET_RISK_CACHE",
+    PetProposer: "PET_PROPOSER_CACHE",
+    Address: "ADDRESS_CACHE",
+    SchemeQuoteResultComment: "SCHEME_QUOTE_RESULT_COMMENT_CACHE",
+}
+
+FIELD_DEFAULTS = {
+    models.IntegerField: 0,
+    models.FloatField: 0.0,
+    models.CharField: "",
+    models.DateTimeField: datetime(2024, 1, 1, tzinfo=timezone.utc),
+    models.DateField: date(2000, 1, 1),
+}
+
+
+def add_row(model, pk, **values):
+    """Insert one row into an (unmanaged) policy table, defaulting the fields not given."""
+    for field in model._meta.concrete_fields:
+        if field.name not in values and not field.primary_key:
+            values[field.name] = FIELD_DEFAULTS[type(field)]
+    return model.objects.using("default").create(pk=pk, **values)
+
+
+def add_policy(pk, creation_date=datetime(2024, 1, 1, tzinfo=timezone.utc)):
+    """One policy transaction with a row in every table the static caches read."""
+    add_row(PolicyMaster, pk, policy_number=f"P{pk}")
+    add_row(PolicyHistory, pk, policy_master_id=pk, risk_id=pk, scheme_quote_result_id=pk, creation_date=creation_date)
+    add_row(Risk, pk)
+    add_row(TransactionType, pk, transaction_name="New Business")
+    add_row(PetRiskPet, pk, risk_id=pk, pet_name=f"pet {pk}")
+    add_row(DefinedListDetail, pk, dld_name=f"detail {pk}")
+    add_row(PetRisk, pk, pet_proposer_id=pk)
+    add_row(PetProposer, pk, address_id=pk)
+    add_row(Address, pk, postcode=f"AB{pk}")
+    add_row(SchemeQuoteResultComment, pk, scheme_quote_result_id=pk, comment_text="Belongs to proposer")
+
+
+class StaticDataSyncTests(TestCase):
+    """sync_static_data() must leave the caches as a full load_static_data() would."""
+
+    databases = {"default"}
+
+    @classmethod
+    def setUpClass(cls):
+        # The policy models are unmanaged (MSSQL tables), so create them here,
+        # before TestCase opens its transaction (SQLite cannot alter schema inside one)
+        with connections["default"].schema_editor() as editor:
+            for model in POLICY_MODELS:
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connections["default"].schema_editor() as editor:
+            for model in POLICY_MODELS:
+                editor.delete_model(model)
+
+    def caches(self):
+        key = lambda model: model._meta.pk.name
+        return {
+            model: getattr(static_data, name).sort_values(key(model)).reset_index(drop=True)
+            for model, name in CACHE_NAMES.items()
+        }
+
+    def test_sync_matches_full_reload(self):
+        for pk in range(1, 6):
+            add_policy(pk)
+        static_data.load_static_data()
+        self.assertEqual(static_data.STATIC_WATERMARKS["PolicyHistory"], 5)
+
+        # New rows past every watermark, plus a PolicyHistory row with a lower id
+        # but a later CreationDate, and a comment for an existing transaction
+        for pk in range(6, 9):
+            add_policy(pk, creation_date=datetime(2024, 6, 1, tzinfo=timezone.utc))
+        add_row(PolicyHistory, 0, policy_master_id=1, risk_id=1, scheme_quote_result_id=1,
+                creation_date=datetime(2024, 7, 1, tzinfo=timezone.utc))
+        add_row(SchemeQuoteResultComment, 20, scheme_quote_result_id=2, comment_text="Belongs to proposer")
+        add_row(SchemeQuoteResultComment, 21, scheme_quote_result_id=3, comment_text="Other comment")
+
+        static_data.sync_static_data()
+        synced = self.caches()
+        watermarks = static_data.STATIC_WATERMARKS
+
+        static_data.load_static_data()
+        reloaded = self.caches()
+
+        for model in POLICY_MODELS:
+            with self.subTest(model=model.__name__):
+                pd.testing.assert_frame_equal(synced[model], reloaded[model], check_dtype=False)
+        self.assertEqual(watermarks, static_data.STATIC_WATERMARKS)
+        self.assertEqual(len(reloaded[PolicyHistory]), 9)
+        self.assertEqual(len(reloaded[SchemeQuoteResultComment]), 9)
+
+    def test_sync_without_changes_fetches_nothing(self):
+        for pk in range(1, 4):
+            add_policy(pk)
+        static_data.load_static_data()
+        before = self.caches()
+
+        static_data.sync_static_data()
+
+        after = self.caches()
+        for model in POLICY_MODELS:
+            with self.subTest(model=model.__name__):
+                pd.testing.assert_frame_equal(before[model], after[model], check_dtype=False)
+
+
+# -------------------------
+# Synthetic rating guide
+# -------------------------
+# Options per factor (breeds per pet type); every factor is a yes / no unless listed
+YES_NO = ["yes", "no"]
+RATE_OPTIONS = {
+    "pet_age": ["1", "24–28"],
+    "pet_age_gender": ["male: 1–50", "female: 51–100"],
+    "pet_price": ["£0–£75", "£301–£600"],
+    "neutered_gender": ["male: yes", "female: no"],
+    "postcode": ["ab", "cd"],
+    "ph_age": ["20 - 29.999", "30 - 39.999"],
+    "dog_breed": ["labrador", "poodle"],
+    "cat_breed": ["persian"],
+}
+for factor in [
+    "chipped", "vaccinations", "pre_existing", "aggressive", "is_pet_yours",
+    "uk_resident", "kept_at_address", "trade_business", "copay", "multipet",
+]:
+    RATE_OPTIONS[factor] = YES_NO
+
+# (pet type, scheme, limit) with rates; cat / premier_plus is left unrated
+RATED_SCHEMES = [("dog", "gold", 4000), ("dog", "premier_plus", 6000), ("cat", "gold", 4000)]
+
+# Declined options: aggressive pets, and poodles on gold
+DECLINED = {("aggressive", "yes"), ("dog_breed", "poodle")}
+
+
+def add_working_rates():
+    """Write the synthetic guide as working PetRates, a distinct rate per row."""
+    rows = []
+    for n, (pet_type, scheme, limit) in enumerate(RATED_SCHEMES):
+        rows.append(PetRates(pet_type=pet_type, scheme=scheme, factor="base_rate", option=None,
+                             rate=100.0 + 10 * n, limit=limit))
+        for factor, options in RATE_OPTIONS.items():
+            if factor.endswith("_breed") and not factor.startswith(pet_type):
+                continue
+            for i, option in enumerate(options):
+                declined = (factor, option) in DECLINED and (factor != "dog_breed" or scheme == "gold")
+                rate = 999 if declined else round(1 + 0.01 * (i + 1) + 0.1 * n, 4)
+                rows.append(PetRates(pet_type=pet_type, scheme=scheme, factor=factor, option=option,
+                                     rate=rate, limit=limit))
+    PetRates.objects.bulk_create(rows)
+    invalidate_rate_table()
+
+
+def pick(rng, options):
+    """A known option most of the time, otherwise an unknown or missing one."""
+    return rng.choice(options) if rng.random() < 0.9 else rng.choice(["unknown", None])
+
+
+# -------------------------
+# Portfolio re-rating (apply_rates) against the old merge chain
+# -------------------------
+PORTFOLIO_FACTORS = [
+    "pet_age_gender", "pet_age", "pet_price", "neutered_gender", "chipped",
+    "vaccinations", "pre_existing", "aggressive", "is_pet_yours", "postcode",
+    "uk_resident", "kept_at_address", "trade_business", "ph_age", "copay", "multipet"
+]
+
+
+def merge_chain(df_merged):
+    """The per-factor DataFrame.merge chain price_policy_frame replaced, as it was."""
+    df_rates = pd.DataFrame(list(PetRates.objects.all().values()))
+    df_rates["scheme"] = df_rates["scheme"].str.replace("_", " ")
+    df_rates = df_rates.rename(columns={"pet_type": "pettype"})
+
+    df_base_rates = df_rates[df_rates["factor"] == "base_rate"][["pettype", "scheme", "rate"]]
+    df_base_rates = df_base_rates.rename(columns={"rate": "base_rate"})
+    df_merged = df_merged.merge(df_base_rates, on=["pettype", "scheme"], how="left")
+
+    df_limits = df_rates[["pettype", "scheme", "limit"]].drop_duplicates()
+    df_merged = df_merged.merge(df_limits, on=["pettype", "scheme"], how="left")
+
+    breed_mask = df_rates["factor"].isin(["dog_breed", "cat_breed"])
+    df_breed_rates = df_rates[breed_mask].rename(columns={"option": "breed", "rate": "breed_factor"})
+    df_breed_rates = df_breed_rates[["pettype", "scheme", "breed", "breed_factor"]]
+    df_merged = df_merged.merge(df_breed_rates, how="left", on=["pettype", "scheme", "breed"])
+    df_merged["breed_factor"] = df_merged["breed_factor"].fillna(999)
+
+    for factor in PORTFOLIO_FACTORS:
+        df_factor = df_rates[df_rates["factor"] == factor].rename(
+            columns={"option": factor, "rate": f"{factor}_factor"}
+        )
+        df_factor = df_factor[["pettype", "scheme", factor, f"{factor}_factor"]]
+        df_merged = df_merged.merge(df_factor, how="left", on=["pettype", "scheme", factor])
+
+    df_merged["re_rated_gwp_per_pet"] = df_merged.eval(
+        "base_rate * pet_age_factor * pet_age_gender_factor * breed_factor * pet_price_factor *"
+        "neutered_gender_factor * chipped_factor * vaccinations_factor * pre_existing_factor *"
+        "aggressive_factor * is_pet_yours_factor * postcode_factor * uk_resident_factor *"
+        "kept_at_address_factor * trade_business_factor * ph_age_factor * copay_factor * multipet_factor"
+    )
+
+    factor_cols = [f"{f}_factor" for f in PORTFOLIO_FACTORS] + ["breed_factor"]
+    df_merged["decline_flag"] = df_merged[factor_cols].eq(999).any(axis=1).map({True: "Y", False: "N"})
+    return df_merged
+
+
+def portfolio(rows=400, seed=0):
+    """Portfolio rows as build_re_rated_policies_cache prepares them (scheme names with spaces)."""
+    rng = random.Random(seed)
+    policies = []
+    for _ in range(rows):
+        pet_type = rng.choice(["dog", "cat"])
+        policy = {
+            "pettype": pet_type,
+            "scheme": rng.choice(["gold", "premier plus", "bronze"]),
+            "breed": pick(rng, RATE_OPTIONS[f"{pet_type}_breed"] + ["mongrel"]),
+        }
+        for factor in PORTFOLIO_FACTORS:
+            policy[factor] = pick(rng, RATE_OPTIONS[factor])
+        policies.append(policy)
+    return pd.DataFrame(policies)
+
+
+class PortfolioRatingTests(TestCase):
+    """price_policy_frame() must price a portfolio exactly as the old merge chain did."""
+
+    databases = {"rates"}
+
+    def setUp(self):
+        add_working_rates()
+
+    def tearDown(self):
+        invalidate_rate_table()
+
+    def test_matches_merge_chain(self):
+        df = portfolio()
+        expected = merge_chain(df.copy())
+        priced = static_data.price_policy_frame(df.copy())
+
+        columns = ["base_rate", "limit", "breed_factor"] + [f"{f}_factor" for f in PORTFOLIO_FACTORS]
+        columns += ["re_rated_gwp_per_pet", "decline_flag"]
+        pd.testing.assert_frame_equal(priced[columns], expected[columns], check_dtype=False)
+
+        # The portfolio covers full premiums, declines and unrated rows
+        self.assertTrue(expected["re_rated_gwp_per_pet"].notna().any())
+        self.assertTrue(expected["base_rate"].isna().any())
+        self.assertEqual(set(expected["decline_flag"]), {"Y", "N"})
+
+
+# -------------------------
+# Rating guide parser
+# -------------------------
+nan = float("nan")
+
+
+def sheet(rows):
+    """A sheet as read with header=None, short rows padded with blanks."""
+    width = max(len(row) for row in rows)
+    return pd.DataFrame([list(row) + [nan] * (width - len(row)) for row in rows])
+
+
+GUIDE_SHEETS = {
+    # Single row of base rates, one unreadable cell (the last cover has no animal, so is skipped)
+    "Base": sheet([
+        ["Rating guide"],
+        [nan, "Animal", "Dog", nan, "Cat", nan],
+        [nan, "Cover Name", "Bronze", "Gold", "Bronze", "Gold"],
+        [nan, "Base Rate", nan, nan, nan, nan],
+        [nan, nan, 101.5, "120", "n/a", 88],
+    ]),
+    # Yes / no rows with declines, text and a blank cell, up to the first blank row
+    "Aggressive": sheet([
+        [nan, "Animal", "Dog", "Dog", "Cat", "Cat"],
+        [nan, "Cover Name", "Bronze", "Gold", "Bronze", "Gold"],
+        [nan, "Aggressive", nan, nan, nan, nan],
+        [nan, "No", 1, 1.0, "1", 1],
+        [nan, "Yes", "Decline", " decline ", "tbc", nan],
+        [nan, nan, nan, nan, nan, nan],
+        [nan, "Notes", "ignored", nan, nan, nan],
+    ]),
+    # Co-pay percentages mapped to yes / no
+    "Copay": sheet([
+        [nan, "Animal", "Dog", "Cat"],
+        [nan, "Cover Name", "Gold", "Gold"],
+        [nan, "Co-Pay", nan, nan],
+        [nan, "0%", 1, 1],
+        [nan, "20%", 0.85, 0.9],
+    ]),
+    # Two headers: age band and gender
+    "Age": sheet([
+        [nan, nan, "Animal", "Dog", "Cat"],
+        [nan, nan, "Cover Name", "Bronze", "Bronze"],
+        [nan, "Pet Age", "Gender", nan, nan],
+        [nan, "1–50", "Male", 1.1, 1.2],
+        [nan, "51–100", "Female", 1.3, "Decline"],
+    ]),
+    # Breeds for one pet type only
+    "Breed": sheet([
+        [nan, "Animal", "Dog", nan, "Cat"],
+        [nan, "Cover Name", "Bronze", "Gold", "Bronze"],
+        [nan, "Dog Breed", nan, nan, nan],
+        [nan, " Labrador ", 1.05, 1.1, nan],
+        [nan, "Poodle", 0.95, "Decline", nan],
+    ]),
+}
+
+# (sheet, header keyword, second header, value field, pet type filter) -> rows,
+# as returned by the parser before it was vectorised
+PARSED_GUIDE = [
+    (("Base", "Base Rate", None, "base_rate", None), [
+        {"pet_type": "dog", "scheme": "Bronze", "base_rate": 101.5, "limit": 2250},
+        {"pet_type": "dog", "scheme": "Gold", "base_rate": 120.0, "limit": 4000},
+        {"pet_type": "cat", "scheme": "Bronze", "base_rate": None, "limit": 2250},
+    ]),
+    (("Aggressive", "Aggressive", None, "aggressive", None), [
+        {"pet_type": "dog", "scheme": "Bronze", "aggressive": {"no": 1.0, "yes": 999}, "limit": 2250},
+        {"pet_type": "dog", "scheme": "Gold", "aggressive": {"no": 1.0, "yes": 999}, "limit": 4000},
+        {"pet_type": "cat", "scheme": "Bronze", "aggressive": {"no": 1.0, "yes": 0}, "limit": 2250},
+        {"pet_type": "cat", "scheme": "Gold", "aggressive": {"no": 1.0, "yes": nan}, "limit": 4000},
+    ]),
+    (("Copay", "Co-Pay", None, "copay", None), [
+        {"pet_type": "dog", "scheme": "Gold", "copay": {"no": 1.0, "yes": 0.85}, "limit": 4000},
+        {"pet_type": "cat", "scheme": "Gold", "copay": {"no": 1.0, "yes": 0.9}, "limit": 4000},
+    ]),
+    (("Age", "Pet Age", "Gender", "pet_age_gender", None), [
+        {"pet_type": "dog", "scheme": "Bronze", "pet_age_gender": {"male: 1–50": 1.1, "female: 51–100": 1.3}, "limit": 2250},
+        {"pet_type": "cat", "scheme": "Bronze", "pet_age_gender": {"male: 1–50": 1.2, "female: 51–100": 999}, "limit": 2250},
+    ]),
+    (("Breed", "Dog Breed", None, "dog_breed", "dog"), [
+        {"pet_type": "dog", "scheme": "Bronze", "dog_breed": {"labrador": 1.05, "poodle": 0.95}, "limit": 2250},
+        {"pet_type": "dog", "scheme": "Gold", "dog_breed": {"labrador": 1.1, "poodle": 999}, "limit": 4000},
+    ]),
+]
+
+
+def comparable(value):
+    """NaN never equals itself, so compare it as a marker."""
+    if isinstance(value, dict):
+        return {key: comparable(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [comparable(item) for item in value]
+    if isinstance(value, float) and math.isnan(value):
+        return "nan"
+    return value
+
+
+class RatingGuideParserTests(TestCase):
+    """parse_rates_excel() must return the same rows as the original row-by-row parser."""
+
+    def test_rows_match_original_parser(self):
+        for args, expected in PARSED_GUIDE:
+            with self.subTest(sheet=args[0]):
+                rows = parse_rates_excel(None, *args, sheets=GUIDE_SHEETS)
+                self.assertEqual(comparable(rows), comparable(expected))
+
+
+# -------------------------
+# Reloading the rating guide
+# -------------------------
+NESTED_GUIDE = {
+    "dog": {
+        "gold": {"base_rate": 120.0, "aggressive": {"no": 1.0, "yes": 999}, "limit": 4000},
+        "premier_plus": {"base_rate": 150.0, "copay": {"no": 1.0, "yes": 0.85}, "limit": 6000},
+    },
+    "cat": {
+        "gold": {"base_rate": 88.0, "aggressive": {"no": 1.0, "yes": 1.2}, "limit": 4000},
+    },
+}
+
+
+class RateReloadTests(TestCase):
+    """Reloading a rating guide writes only the PetRates rows that changed."""
+
+    databases = {"rates"}
+
+    def tearDown(self):
+        invalidate_rate_table()
+
+    def working_rates(self):
+        return {
+            (pet_type, scheme, factor, option): (pk, rate)
+            for pk, pet_type, scheme, factor, option, rate in PetRates.objects.filter(rate_set=None)
+            .values_list("id", "pet_type", "scheme", "factor", "option", "rate")
+        }
+
+    def test_unchanged_guide_writes_nothing(self):
+        summary = save_nested_rates_to_db(NESTED_GUIDE)
+        self.assertEqual(summary["inserted"], 9)
+        before = self.working_rates()
+
+        with CaptureQueriesContext(connections["rates"]) as queries:
+            summary = save_nested_rates_to_db(NESTED_GUIDE)
+
+        self.assertEqual(summary, {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 9})
+        writes = [q["sql"] for q in queries if q["sql"].lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))]
+        self.assertEqual(writes, [])
+        self.assertEqual(self.working_rates(), before)
+
+    def test_changed_rate_is_updated_in_place(self):
+        save_nested_rates_to_db(NESTED_GUIDE)
+        before = self.working_rates()
+
+        changed = {
+            "dog": {**NESTED_GUIDE["dog"], "gold": {"base_rate": 125.0, "aggressive": {"no": 1.0}, "limit": 4000}},
+            "cat": NESTED_GUIDE["cat"],
+        }
+        summary = save_nested_rates_to_db(changed)
+
+        self.assertEqual(summary, {"inserted": 0, "updated": 1, "deleted": 1, "unchanged": 7})
+        after = self.working_rates()
+        key = ("dog", "gold", "base_rate", None)
+        self.assertEqual(after[key], (before[key][0], 125.0))
+        self.assertNotIn(("dog", "gold", "aggressive", "yes"), after)
+        self.assertEqual(
+            {k: v for k, v in after.items() if k != key},
+            {k: v for k, v in before.items() if k not in (key, ("dog", "gold", "aggressive", "yes"))},
+        )
+
+    def test_rate_set_needs_version_and_effective_date(self):
+        save_nested_rates_to_db(NESTED_GUIDE)
+        before = self.working_rates()
+        snapshot = static_data.RATE_SNAPSHOT_FILE
+        snapshot_stamp = snapshot.stat().st_mtime_ns if snapshot.exists() else None
+
+        # Rejected up front, before the guide is read or the working rates are replaced
+        with self.assertRaises(ValueError):
+            static_data.all_rates(version="v41")
+        with self.assertRaises(ValueError):
+            static_data.all_rates(effective_date=date(2024, 1, 1))
+        with self.assertRaises(ValueError):
+            publish_rate_set("v41", None)
+        with self.assertRaises(ValueError):
+            publish_rate_set("", date(2024, 1, 1))
+
+        self.assertEqual(self.working_rates(), before)
+        self.assertFalse(RateSet.objects.exists())
+        self.assertEqual(snapshot.stat().st_mtime_ns if snapshot.exists() else None, snapshot_stamp)
+
+
+# -------------------------
+# Rate sets in force
+# -------------------------
+class RateSetsInForceTests(TestCase):
+    """rate_sets_in_force() picks the latest rate set effective on or before each date."""
+
+    databases = {"rates"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.v1 = RateSet.objects.create(version="v1", effective_date=date(2024, 1, 1)).id
+        cls.v2 = RateSet.objects.create(version="v2", effective_date=date(2024, 6, 1)).id
+        # Published later for the same day, so it replaces v3
+        cls.v3 = RateSet.objects.create(version="v3", effective_date=date(2024, 9, 1)).id
+        cls.v3b = RateSet.objects.create(version="v3b", effective_date=date(2024, 9, 1)).id
+
+    def tearDown(self):
+        invalidate_rate_table()
+
+    def test_boundaries(self):
+        dates = pd.Series(pd.to_datetime([
+            "2023-12-31",           # before the first rate set
+            "2024-01-01",           # on an effective date
+            "2024-05-31 23:59",     # the day before the next one
+            "2024-06-01",
+            "2024-08-15",
+            "2024-09-01",           # two rate sets effective that day
+            "2030-01-01",           # after the last
+            None,                   # no effective date
+        ], format="ISO8601"))
+        expected = [None, self.v1, self.v1, self.v2, self.v2, self.v3b, self.v3b, None]
+
+        self.assertEqual(list(rate_sets_in_force(dates)), expected)
+        for day, rate_set in zip(dates[dates.notna()], expected):
+            with self.subTest(day=day):
+                self.assertEqual(rate_set_on(day.date()), rate_set)
+
+    def test_timezone_aware_dates(self):
+        dates = pd.Series(pd.to_datetime(["2023-12-31", "2024-06-01"]).tz_localize("UTC"))
+        self.assertEqual(list(rate_sets_in_force(dates)), [None, self.v2])
+
+    def test_pricing_with_rate_set_in_force(self):
+        # v1 and v2 hold the synthetic guide, v2 with base rates 5 higher
+        add_working_rates()
+        publish_rate_set("v1", date(2024, 1, 1))
+        PetRates.objects.filter(rate_set=None, factor="base_rate").update(rate=models.F("rate") + 5)
+        publish_rate_set("v2", date(2024, 6, 1))
+
+        df = portfolio(rows=200)
+        df["effective_date"] = pd.to_datetime(
+            pd.Series(["2023-06-01", "2024-03-01", "2024-07-01", None] * 50), format="ISO8601"
+        )
+        priced = static_data.price_policy_frame(df.copy(), static_data.RATE_SET_IN_FORCE)
+
+        self.assertEqual(
+            priced["rate_set_id"].tolist()[:4], [pd.NA, self.v1, self.v2, pd.NA]
+        )
+        columns = ["base_rate", "limit", "breed_factor", "re_rated_gwp_per_pet", "decline_flag"]
+        for rate_set in (self.v1, self.v2):
+            with self.subTest(rate_set=rate_set):
+                rows = (priced["rate_set_id"] == rate_set).fillna(False).to_numpy()
+                expected = static_data.price_policy_frame(df[rows].copy(), rate_set)
+                pd.testing.assert_frame_equal(
+                    priced.loc[rows, columns].reset_index(drop=True), expected[columns].reset_index(drop=True)
+                )
+
+        # Rows with no rate set in force are left unpriced, not priced with the working rates
+        unpriced = priced[priced["rate_set_id"].isna()]
+        self.assertEqual(len(unpriced), 100)
+        self.assertTrue(unpriced[["base_rate", "breed_factor", "re_rated_gwp_per_pet"]].isna().all().all())
+        self.assertEqual(set(unpriced["decline_flag"]), {"N"})
+
+    def test_no_rate_sets(self):
+        RateSet.objects.all().delete()
+        self.assertEqual(list(rate_sets_in_force(pd.Series(pd.to_datetime(["2024-01-01", None])))), [None, None])
+
+
+# -------------------------
+# Batch quotes (price_risks) against single quotes (quote_premium)
+# -------------------------
+YES_NO_FIELDS = [
+    "chipped", "vaccinations", "pre_existing", "aggressive", "is_pet_yours",
+    "uk_resident", "kept_at_address", "trade_business", "copay", "multipet",
+]
+
+
+def quote_requests(count=300, seed=0):
+    """Premium calculator requests: band labels or raw values, odd casing and hyphens, gaps."""
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        request = {
+            "pet_type": rng.choice(["dog", "Dog", "cat"]),
+            "cover_level": rng.choice(["Gold", "premier plus", "Premier_Plus", "bronze"]),
+            "pet_gender": pick(rng, ["male", "Female"]),
+            "breed": pick(rng, [" Labrador ", "poodle", "persian", "mongrel"]),
+            "neutered": pick(rng, ["yes", "No"]),
+            "postcode": pick(rng, ["AB", "cd"]),
+        }
+        if rng.random() < 0.5:
+            request["pet_age1"] = pick(rng, ["1-50", "51-100"])
+            request["pet_age2"] = pick(rng, ["1", "24-28"])
+        else:
+            request["pet_age_months"] = rng.choice([1, 26, 60, None])
+        if rng.random() < 0.5:
+            request["pet_price"] = pick(rng, RATE_OPTIONS["pet_price"])
+            request["ph_age"] = pick(rng, RATE_OPTIONS["ph_age"])
+        else:
+            request["cost_of_pet"] = rng.choice([50, 400, None])
+            request["ph_age_years"] = rng.choice([25, 35, None])
+        for field in YES_NO_FIELDS:
+            request[field] = pick(rng, ["yes", "Yes", "no"])
+        requests.append(request)
+    return requests
+
+
+class BatchQuoteTests(TestCase):
+    """price_risks() must price every risk as quote_premium() does."""
+
+    databases = {"rates"}
+
+    def setUp(self):
+        add_working_rates()
+
+    def tearDown(self):
+        invalidate_rate_table()
+
+    def test_matches_quote_premium(self):
+        requests = quote_requests()
+        priced = price_risks(requests)
+        premiums = 0
+
+        for i, request in enumerate(requests):
+            quote = quote_premium(request["pet_type"], request["cover_level"], risk_options(request))
+            row = priced.iloc[i]
+            with self.subTest(row=i):
+                if quote is None:
+                    self.assertTrue(math.isnan(row["base_rate"]))
+                    self.assertTrue(math.isnan(row["premium"]))
+                    continue
+
+                self.assertEqual(row["base_rate"], quote["base_rate"])
+                self.assertEqual(row["limit"], quote["limit"])
+                for factor in RATING_FACTORS:
+                    rate = row[f"{factor}_factor"]
+                    if factor in quote["factors"]:
+                        self.assertEqual(rate, quote["factors"][factor])
+                    else:
+                        self.assertTrue(math.isnan(rate))
+                if quote["premium"] is None:
+                    self.assertTrue(math.isnan(row["premium"]))
+                else:
+                    self.assertAlmostEqual(row["premium"], quote["premium"])
+                    premiums += 1
+                self.assertEqual(row["decline_flag"], quote["decline_flag"])
+                self.assertEqual(row["missing"], ",".join(quote["missing"]))
+
+        # Some requests are fully rated
+        self.assertGreater(premiums, 0)
+
+    def test_json_booleans_are_yes_no(self):
+        requests = quote_requests()
+        as_booleans = [
+            {
+                field: {"yes": True, "no": False}.get(str(value).lower(), value)
+                if field in YES_NO_FIELDS + ["neutered"] else value
+                for field, value in request.items()
+            }
+            for request in requests
+        ]
+
+        response = self.client.post(reverse("quote_batch"), as_booleans, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        quotes = pd.DataFrame(response.json()["quotes"])
+        expected = price_risks(requests)
+
+        pd.testing.assert_series_equal(quotes["premium"], expected["premium"], check_dtype=False)
+        self.assertEqual(quotes["missing"].tolist(), expected["missing"].tolist())
+        self.assertEqual(quotes["decline_flag"].tolist(), expected["decline_flag"].tolist())
+        self.assertTrue(quotes["premium"].notna().any())
+
+        # And the same answers in a single quote
+        for request, boolean_request in zip(requests, as_booleans):
+            self.assertEqual(
+                quote_premium(boolean_request["pet_type"], boolean_request["cover_level"], risk_options(boolean_request)),
+                quote_premium(request["pet_type"], request["cover_level"], risk_options(request)),
+            )
+
+
+# -------------------------
+# Single quotes
+# -------------------------
+FULL_REQUEST = {
+    "pet_type": "dog", "cover_level": "Premier Plus", "pet_gender": "male", "pet_age1": "1-50",
+    "pet_age2": "24-28", "breed": "labrador", "neutered": "yes", "pet_price": "£301–£600",
+    "postcode": "AB", "ph_age": "30 - 39.999", **{field: "no" for field in YES_NO_FIELDS},
+}
+
+
+class QuotePremiumTests(TestCase):
+    """quote_premium() gives a premium only once every rating factor is answered."""
+
+    databases = {"rates"}
+
+    def setUp(self):
+        add_working_rates()
+
+    def tearDown(self):
+        invalidate_rate_table()
+
+    def test_full_answers_match_premium_formula(self):
+        quote = quote_premium("dog", "Premier Plus", risk_options(FULL_REQUEST))
+
+        self.assertEqual(quote["missing"], [])
+        self.assertEqual(sorted(quote["factors"]), sorted(RATING_FACTORS))
+        rates = pd.DataFrame([{"base_rate": quote["base_rate"], **{
+            f"{factor}_factor": rate for factor, rate in quote["factors"].items()
+        }}])
+        self.assertAlmostEqual(quote["premium"], rates.eval(PREMIUM_FORMULA)[0])
+        self.assertEqual(quote["decline_flag"], "N")
+
+    def test_unanswered_factor_leaves_no_premium(self):
+        for field in ["vaccinations", "pre_existing", "ph_age"]:
+            with self.subTest(field=field):
+                request = {**FULL_REQUEST, field: ""}
+                quote = quote_premium("dog", "Premier Plus", risk_options(request))
+                self.assertIsNone(quote["premium"])
+                self.assertEqual(quote["missing"], [field])
+
+
+# -------------------------
+# Incremental re-rating
+# -------------------------
+def policy_frames(policies):
+    """static_frames()-shaped source tables: one risk, pet, proposer, address and quote per policy."""
+    ids = list(policies)
+    return {
+        "master": pd.DataFrame({"policy_master_id": ids, "policy_number": [f"P{pk}" for pk in ids]}),
+        "history": pd.DataFrame({"policy_master_id": ids, "risk_id": ids, "scheme_quote_result_id": ids,
+                                 "gwp": [policies[pk]["gwp"] for pk in ids]}),
+        "risk": pd.DataFrame({"risk_id": ids, "voluntary_excess": 0}),
+        "prp": pd.DataFrame({"risk_id": ids, "pet_name": [f"pet {pk}" for pk in ids]}),
+        "pr": pd.DataFrame({"risk_id": ids, "pet_proposer_id": ids}),
+        "pp": pd.DataFrame({"pet_proposer_id": ids, "address_id": ids}),
+        "address": pd.DataFrame({"address_id": ids, "postcode": [policies[pk]["postcode"] for pk in ids]}),
+        "sqrc": pd.DataFrame({"scheme_quote_result_id": ids, "comment_text": "Belongs to proposer"}),
+        "tt": pd.DataFrame({"transaction_type_id": [1, 2], "transaction_name": ["New Business", "Renewal"]}),
+        "dld": pd.DataFrame({"dld_id": [1], "dld_name": ["Labrador"]}),
+    }
+
+
+class IncrementalReRatingTests(TestCase):
+    """An incremental re-rate must give the same rows as a full one."""
+
+    databases = {"rates"}
+
+    def setUp(self):
+        add_working_rates()
+
+    def tearDown(self):
+        invalidate_rate_table()
+
+    def test_repricing_changed_rates_matches_full_reprice(self):
+        df = portfolio()
+        rng = random.Random(1)
+        df["row"] = range(len(df))
+        df["transaction_name"] = [rng.choice(["New Business", "Renewal"]) for _ in range(len(df))]
+        df["inception_month"] = [rng.choice([202401.0, 202402.0]) for _ in range(len(df))]
+        previous_rates = static_data.rates_snapshot()
+
+        # The previous run, as re_rated_cache() reads it back from the dataset
+        with tempfile.TemporaryDirectory() as folder:
+            write_partitioned(Path(folder), static_data.price_policy_frame(df.copy()), static_data.RE_RATED_PARTITIONING)
+            previous = read_partitioned(Path(folder), static_data.RE_RATED_PARTITIONING)
+
+        # One option and one base rate changed, one breed removed and one added
+        working = PetRates.objects.filter(rate_set=None)
+        working.filter(pet_type="dog", scheme="gold", factor="chipped", option="yes").update(rate=1.5)
+        working.filter(pet_type="cat", scheme="gold", factor="base_rate").update(rate=95.0)
+        working.filter(pet_type="dog", scheme="premier_plus", factor="dog_breed", option="labrador").delete()
+        PetRates.objects.create(pet_type="dog", scheme="gold", factor="dog_breed", option="mongrel", rate=1.25, limit=4000)
+        invalidate_rate_table()
+
+        rate_keys = static_data.changed_rates(previous_rates, static_data.rates_snapshot())
+        self.assertEqual(len(rate_keys), 4)
+        repriced = static_data.rows_using_rates(previous, rate_keys)
+        self.assertTrue(0 < repriced.sum() < len(previous))
+
+        incremental = pd.concat(
+            [previous[~repriced], static_data.price_policy_frame(previous[repriced].copy())],
+            ignore_index=True,
+        )
+        full = static_data.price_policy_frame(df.copy())
+
+        columns = ["row", "base_rate", "limit", "breed_factor"] + [f"{f}_factor" for f in PORTFOLIO_FACTORS]
+        columns += ["re_rated_gwp_per_pet", "decline_flag"]
+        pd.testing.assert_frame_equal(
+            incremental[columns].sort_values("row").reset_index(drop=True),
+            full[columns].sort_values("row").reset_index(drop=True),
+            check_dtype=False,
+        )
+
+    def test_changed_policies(self):
+        policies = {pk: {"gwp": 100.0 + pk, "postcode": f"AB{pk}"} for pk in range(1, 6)}
+        previous = static_data.policy_input_hashes(policy_frames(policies))
+
+        # Reordered rows are not a change
+        frames = {name: frame.iloc[::-1] for name, frame in policy_frames(policies).items()}
+        self.assertEqual(len(static_data.changed_policies(previous, static_data.policy_input_hashes(frames))), 0)
+
+        # Policy 2 moved address, policy 3 was removed and policy 6 is new
+        policies[2] = {**policies[2], "postcode": "CD2"}
+        del policies[3]
+        policies[6] = {"gwp": 106.0, "postcode": "AB6"}
+        current = static_data.policy_input_hashes(policy_frames(policies))
+        self.assertEqual(sorted(static_data.changed_policies(previous, current)), [2, 3, 6])
+
+        # A change to a shared lookup table touches every policy
+        frames = policy_frames(policies)
+        frames["tt"].loc[1, "transaction_name"] = "Renewals"
+        changed = static_data.changed_policies(current, static_data.policy_input_hashes(frames))
+        self.assertEqual(list(changed), [static_data.SHARED_INPUTS_ID])
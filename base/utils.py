@@ -1,8 +1,11 @@
 import pandas as pd
 import numpy as np
-from .models import PetRates
+from .models import PetRates, RateSet
 from collections import defaultdict
-from django.db import transaction
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from django.db import router, transaction
+from .rate_table import invalidate_rate_table, normalize_key
 
 cover_limits = {
     "Bronze": 2250,
@@ -27,41 +30,117 @@ def merge_nested_structures(base_dict, new_dict):
             base_dict[pet_type][scheme].update(factors)
     return base_dict
 
-def parse_rates_excel(file_path, sheet_name, header_keyword, header_keyword2, value_field, pet_type_filter=None):
+def _read_sheet(file_path, sheet_name):
+    """Read one sheet with no header row (module level so it can run in a worker process)."""
+    return pd.read_excel(file_path, sheet_name=sheet_name, header=None)
+
+
+def read_rating_guide(file_path, sheet_names, processes=None):
+    """
+    Read every sheet the factor parsers need in one pass: {sheet_name: DataFrame}.
+    The workbook is opened once and each sheet parsed from it; with processes > 1
+    the sheets are read in a process pool instead, one sheet per task.
+    """
+    sheet_names = list(dict.fromkeys(sheet_names))
+
+    if processes and processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            return dict(zip(sheet_names, pool.map(_read_sheet, repeat(file_path), sheet_names)))
+
+    with pd.ExcelFile(file_path) as workbook:
+        return pd.read_excel(workbook, sheet_name=sheet_names, header=None)
+
+
+def find_header_rows(df, keywords):
+    """
+    First row containing each keyword (case-insensitive regex, as str.contains),
+    from one pass over the sheet: the cells are stringified once and each
+    keyword is only matched against the distinct cell texts.
+    Returns {keyword: row}, None where a keyword is not found.
+    """
+    cells = pd.Series(df.to_numpy(dtype=object).ravel(), dtype=object)
+    present = cells.notna().to_numpy()
+    codes, texts = pd.factorize(cells[present].astype(str))
+    rows = np.flatnonzero(present) // max(df.shape[1], 1)
+    texts = pd.Series(texts, dtype=object)
+
+    found = {}
+    for keyword in dict.fromkeys(keywords):
+        hits = texts.str.contains(keyword, case=False, na=False).to_numpy(dtype=bool)
+        matched = rows[hits[codes]]
+        found[keyword] = df.index[matched.min()] if len(matched) else None
+    return found
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+def convert_rates(block, default, decline=None):
+    """
+    Convert a block of rate cells to floats in one pass: pd.to_numeric for the
+    numbers, decline (if given) for cells reading 'decline' and default for any
+    other text. Blank cells stay NaN. Returns an object array of Python values
+    shaped like block.
+    """
+    cells = pd.Series(block.to_numpy(dtype=object).ravel(), dtype=object)
+    numbers = pd.to_numeric(cells, errors="coerce").astype(float)
+    values = numbers.to_numpy().astype(object)
+
+    # Anything to_numeric could not read gets the same float() / default treatment as a single cell
+    failed = (numbers.isna() & cells.notna()).to_numpy()
+    if failed.any():
+        failed_cells = cells[failed]
+        fallback = np.array([_to_float(value, default) for value in failed_cells], dtype=object)
+        if decline is not None:
+            declined = (
+                failed_cells.map(lambda value: isinstance(value, str))
+                & failed_cells.astype(str).str.strip().str.lower().eq("decline")
+            ).to_numpy(dtype=bool)
+            fallback[declined] = decline
+        values[failed] = fallback
+
+    return values.reshape(block.shape)
+
+
+def parse_rates_excel(file_path, sheet_name, header_keyword, header_keyword2, value_field, pet_type_filter=None, sheets=None):
     """
     Universal Excel parser for rating data.
     Handles:
       • Single-row and multi-row labeled rates
       • Dual headers (e.g. Animal Age + Animal Gender)
+    Pass sheets (from read_rating_guide) to parse an already loaded sheet
+    instead of reading it from file_path.
     Returns a list of dicts:
       pet_type, scheme, <value_field>, limit
     """
-    df = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
+    if sheets is not None:
+        df = sheets[sheet_name]
+    else:
+        df = _read_sheet(file_path, sheet_name)
     print(f"✅ Loaded sheet '{sheet_name}' with shape {df.shape}")
 
-    # --- Helper to find header row ---
-    def find_row(keyword):
-        matches = df[df.apply(lambda r: r.astype(str).str.contains(keyword, case=False, na=False).any(), axis=1)]
-        if matches.empty:
+    # --- Identify header rows in one scan ---
+    header_rows = find_header_rows(df, ["animal", "cover name", header_keyword] + ([header_keyword2] if header_keyword2 is not None else []))
+    for keyword in ["animal", "cover name", header_keyword]:
+        if header_rows[keyword] is None:
             raise ValueError(f"❌ Could not find '{keyword}' in sheet '{sheet_name}'.")
-        print(f"🔍 Found '{keyword}' at row {matches.index[0]}")
-        return matches.index[0]
+        print(f"🔍 Found '{keyword}' at row {header_rows[keyword]}")
+    animal_row_idx = header_rows["animal"]
+    cover_row_idx = header_rows["cover name"]
+    header_idx = header_rows[header_keyword]
 
-    # --- Identify header rows safely ---
-    animal_row_idx = find_row("animal")
-    cover_row_idx = find_row("cover name")
-    header_idx = find_row(header_keyword)
-
-    # Try to find the optional second header
+    # The second header is optional
+    header_idx2 = None
     if header_keyword2 is not None:
-        try:
-            header_idx2 = find_row(header_keyword2)
+        header_idx2 = header_rows[header_keyword2]
+        if header_idx2 is not None:
             print(f"🔍 Found second header '{header_keyword2}' at row {header_idx2}")
-        except ValueError:
-            header_idx2 = None
+        else:
             print(f"⚠️ '{header_keyword2}' not found — continuing with single header")
-    else:
-        header_idx2 = None
 
     # --- Column setup ---
     start_col = df.iloc[animal_row_idx].first_valid_index() + 1
@@ -69,19 +148,17 @@ def parse_rates_excel(file_path, sheet_name, header_keyword, header_keyword2, va
     col_positions = list(range(start_col, end_col))
     animals = df.iloc[animal_row_idx, col_positions].astype(str).replace("", np.nan).ffill()
     covers = df.iloc[cover_row_idx, col_positions].astype(str).replace("", np.nan).ffill()
-    # --- Identify label area ---
-    start_idx = header_idx + 1
-    end_idx = start_idx
-    while end_idx < len(df) and not df.iloc[end_idx].isna().all():
-        end_idx += 1
 
-    data_slice = df.iloc[start_idx:end_idx, :]
+    # --- Identify label area (runs to the first blank row) ---
+    start_idx = header_idx + 1
+    blank_rows = np.flatnonzero(df.isna().all(axis=1).to_numpy()[start_idx:])
+    end_idx = start_idx + blank_rows[0] if len(blank_rows) else max(len(df), start_idx)
 
     # --- Detect first populated column ---
-    first_populated_col = data_slice.apply(lambda col: col.first_valid_index(), axis=0).dropna()
-    if first_populated_col.empty:
+    populated = df.iloc[start_idx:end_idx, :].notna().any(axis=0)
+    if not populated.any():
         raise ValueError("No populated column found for labels")
-    label_col_idx = int(first_populated_col.index[0])
+    label_col_idx = int(populated.index[populated.to_numpy()][0])
 
     # --- Extract labels ---
     label_col = df.iloc[start_idx:end_idx, label_col_idx].astype(str).str.strip()
@@ -97,63 +174,40 @@ def parse_rates_excel(file_path, sheet_name, header_keyword, header_keyword2, va
         print(f"🧩 Combined label column: {label_col}")
 
     # --- Map labels to normalized options (copay support) ---
-    label_map = {}
-    for i, label in enumerate(label_col):
-        if value_field == "copay" and label in ["0", "0%"]:
-            label_map[i] = "no"
-        elif value_field == "copay" and label in ["0.2", "20%"]:
-            label_map[i] = "yes"
-        else:
-            label_map[i] = label.lower()
-    print(f"🔹 Label map: {label_map}")
+    raw_labels = pd.Series(list(label_col), dtype=object)
+    labels = raw_labels.str.lower()
+    if value_field == "copay":
+        labels = labels.mask(raw_labels.isin(["0", "0%"]), "no").mask(raw_labels.isin(["0.2", "20%"]), "yes")
+    labels = labels.tolist()
+    print(f"🔹 Label map: {dict(enumerate(labels))}")
 
     # --- Detect multi-row ---
-    is_multi_row = len(label_map) > 1
+    is_multi_row = len(labels) > 1
     print(f"🔹 Detected multi-row: {is_multi_row}")
 
-    table_rows = []
-
     if is_multi_row:
-        values_rows = df.iloc[header_idx + 1 : header_idx + 1 + len(label_map), col_positions]
+        values = convert_rates(
+            df.iloc[header_idx + 1 : header_idx + 1 + len(labels), col_positions], default=0, decline=999
+        )
+    else:
+        values = convert_rates(df.iloc[[header_idx + 1], col_positions], default=None)
 
-        for rel_idx, pet_type in enumerate(animals):
-            scheme = str(covers.iloc[rel_idx]).strip()
+    table_rows = []
+    for rel_idx, pet_type in enumerate(animals):
+        scheme = str(covers.iloc[rel_idx]).strip()
+        if is_multi_row:
             if pet_type_filter and pet_type.lower() != pet_type_filter.lower():
                 continue
+            value = dict(zip(labels, values[:, rel_idx].tolist()))
+        else:
+            value = values[0, rel_idx]
 
-            rates_dict = {}
-            for row_idx in range(values_rows.shape[0]):
-                cell_val = values_rows.iloc[row_idx, rel_idx]
-                if isinstance(cell_val, str) and cell_val.strip().lower() == "decline":
-                    val = 999
-                else:
-                    try:
-                        val = float(cell_val)
-                    except (ValueError, TypeError):
-                        val = 0
-                rates_dict[label_map[row_idx]] = val
-
-            table_rows.append({
-                'pet_type': pet_type.lower(),
-                'scheme': scheme,
-                value_field: rates_dict,
-                'limit': cover_limits.get(scheme, 0) if 'cover_limits' in globals() else 0
-            })
-
-    else:
-        values_row = df.iloc[header_idx + 1, col_positions]
-        for rel_idx, pet_type in enumerate(animals):
-            scheme = str(covers.iloc[rel_idx]).strip()
-            try:
-                val = float(values_row.iloc[rel_idx])
-            except (ValueError, TypeError):
-                val = None
-            table_rows.append({
-                'pet_type': pet_type.lower(),
-                'scheme': scheme,
-                value_field: val,
-                'limit': cover_limits.get(scheme, 0) if 'cover_limits' in globals() else 0
-            })
+        table_rows.append({
+            'pet_type': pet_type.lower(),
+            'scheme': scheme,
+            value_field: value,
+            'limit': cover_limits.get(scheme, 0) if 'cover_limits' in globals() else 0
+        })
 
     print("✅ Finished parsing table rows.")
     return table_rows
@@ -190,12 +244,14 @@ def save_nested_rates_to_db(nested_rates):
     """
     Save parsed nested rates into PetRates table.
     Handles both single-value and multi-option factors (e.g., yes/no).
-    Uses bulk_create for efficiency.
+    Only rows that changed are written (see sync_rate_records); returns the change summary.
     """
     records = []
 
     for pet_type, schemes in nested_rates.items():
         for scheme, factors in schemes.items():
+            # Keys are stored normalised so lookups never need iexact
+            pet_type, scheme = normalize_key(pet_type, scheme)
             scheme_name = scheme.replace("_", " ").title()
             limit_val = cover_limits.get(scheme_name, 0)
 
@@ -238,7 +294,100 @@ def save_nested_rates_to_db(nested_rates):
                             )
                         )
 
-    # ✅ Bulk save all at once (faster than many update_or_create calls)
-    with transaction.atomic():
-        PetRates.objects.all().delete()
-        PetRates.objects.bulk_create(records)
\ No newline at end of file
+    # ✅ Write only what changed
+    summary = sync_rate_records(records)
+    print(
+        f"✅ PetRates: {summary['inserted']} inserted, {summary['updated']} updated, "
+        f"{summary['deleted']} deleted, {summary['unchanged']} unchanged"
+    )
+
+    # Force the compiled rate table to rebuild from the new rows
+    if summary["inserted"] or summary["updated"] or summary["deleted"]:
+        invalidate_rate_table()
+
+    return summary
+
+
+# Rows per INSERT / UPDATE / DELETE statement when syncing PetRates
+RATE_WRITE_BATCH = 500
+
+
+def sync_rate_records(records):
+    """
+    Make the working PetRates match records (unsaved PetRates) by diffing on the
+    (pet_type, scheme, factor, option) key: new keys are inserted, changed
+    rate / limit values updated in place (ids are kept) and keys no longer
+    present deleted, each in batched statements inside one transaction.
+    Returns {"inserted", "updated", "deleted", "unchanged"} counts.
+    """
+    wanted = {(r.pet_type, r.scheme, r.factor, r.option): r for r in records}
+
+    # Read and write in one transaction, locking the working rows where the
+    # database supports it, so concurrent reloads cannot plan from the same rows
+    with transaction.atomic(using=router.db_for_write(PetRates)):
+        existing = {}
+        to_delete = []
+        rows = PetRates.objects.select_for_update().filter(rate_set=None).values_list(
+            "id", "pet_type", "scheme", "factor", "option", "rate", "limit"
+        )
+        for pk, pet_type, scheme, factor, option, rate, limit in rows.iterator():
+            key = (pet_type, scheme, factor, option)
+            if key in wanted and key not in existing:
+                existing[key] = (pk, rate, limit)
+            else:
+                # No longer in the guide (or a duplicate of a NULL-option key)
+                to_delete.append(pk)
+
+        to_create, to_update = [], []
+        for key, record in wanted.items():
+            if key not in existing:
+                to_create.append(record)
+                continue
+            pk, rate, limit = existing[key]
+            if rate != record.rate or limit != record.limit:
+                record.pk = pk
+                to_update.append(record)
+
+        for start in range(0, len(to_delete), RATE_WRITE_BATCH):
+            PetRates.objects.filter(pk__in=to_delete[start:start + RATE_WRITE_BATCH]).delete()
+        PetRates.objects.bulk_update(to_update, ["rate", "limit"], batch_size=RATE_WRITE_BATCH)
+        PetRates.objects.bulk_create(to_create, batch_size=RATE_WRITE_BATCH)
+
+    return {
+        "inserted": len(to_create),
+        "updated": len(to_update),
+        "deleted": len(to_delete),
+        "unchanged": len(existing) - len(to_update),
+    }
+
+
+def publish_rate_set(version, effective_date, source=""):
+    """
+    Copy the working PetRates into a RateSet in force from effective_date, so
+    the guide can still be priced with after later reloads. Publishing an
+    existing version replaces its rates. Returns the RateSet.
+    Raises ValueError if version or effective_date is missing.
+    """
+    if not version or effective_date is None:
+        raise ValueError("❌ A rate set needs both a version and an effective_date.")
+
+    with transaction.atomic(using=router.db_for_write(PetRates)):
+        rate_set, _ = RateSet.objects.update_or_create(
+            version=version, defaults={"effective_date": effective_date, "source": source}
+        )
+        PetRates.objects.filter(rate_set=rate_set).delete()
+        rows = PetRates.objects.filter(rate_set=None).order_by("id").values_list(
+            "pet_type", "scheme", "factor", "option", "rate", "limit"
+        )
+        PetRates.objects.bulk_create(
+            [
+                PetRates(rate_set=rate_set, pet_type=pet_type, scheme=scheme, factor=factor,
+                         option=option, rate=rate, limit=limit)
+                for pet_type, scheme, factor, option, rate, limit in rows.iterator()
+            ],
+            batch_size=RATE_WRITE_BATCH,
+        )
+
+    invalidate_rate_table()
+    print(f"✅ Published rate set {rate_set}")
+    return rate_set
@@ -2,10 +2,17 @@ import pandas as pd
 from django.shortcuts import render
 from .models import *
 from collections import defaultdict
-from django.views.decorators.http import require_GET
-from django.http import JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.csrf import csrf_exempt
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+import io
+import json
 from .utils import *
-from base import static_data
+from .rate_table import get_scheme_rates, get_option_lists
+from .pricing import quote_premium, risk_options
+from .factor_grid import get_factor_grid
+from .rating_engine import price_risks
+from .report_engine import monthly_summary, policy_detail, export_re_rated, EXPORT_FORMATS
 from .forms import UserForms
 
 # Helper to convert defaultdict -> dict recursively
@@ -76,254 +83,57 @@ cover_limits = {
     "Premier Plus": 8000
 }
 
-pet_age_order = ['0','1','2','3','4','5','6','7','8','9','10','11','12','13','14','15','16',
-             '17','18','19','20','21','22','23','24–28','29–31','32–34','35–37','38–40',
-             '41–43','44–46','47–48','49–54','55–60','61–66','67–72','73–78','79–84',
-             '85–90','91–96','97–102','103–108','109–114','115–120','121–126','127–132',
-             '133–138','139–144','145–150','151–156','157–162','163–168','169–174','175–180',
-             '181–186','187–192','193–204','205–216','217–228','229–240','241+']
-
-ph_age_order = ['0 - 19.999','20 - 29.999','30 - 39.999','40 - 49.999','50 - 59.999','60 - 69.999','70 - 79.999','80 - 89.999','90 and over']
-
-pet_price_order = [ '£0–£75','£76–£150','£151–£300','£301–£600','£601–£1,200','£1,201+']
-
 def rates(request):
     context = {'factors': factors}
     return render(request, 'base/rates.html', context)
 
 
-def get_rates_from_db(factor):
-    """
-    Returns a nested dictionary similar to nested_rates_dict
-    but fetched from the DB.
-    Handles both single-value and multi-option factors.
-    """
-    qs = PetRates.objects.filter(factor=factor)
-    nested = {}
-
-    for row in qs:
-        pet_dict = nested.setdefault(row.pet_type, {})
-        scheme_dict = pet_dict.setdefault(row.scheme, {"limit": row.limit})
-
-        # Handle options (e.g. yes/no) vs single values
-        if row.option:
-            existing_value = scheme_dict.get(factor)
-            if not isinstance(existing_value, dict):
-                # Convert float or None into a dict
-                scheme_dict[factor] = {}
-            scheme_dict[factor][row.option] = row.rate
-        else:
-            scheme_dict[factor] = row.rate
-
-    return nested
-
-def base_rates(request):
-    nested_rates = get_rates_from_db("base_rate")
-
-    return render(request, "base/rates/base_rates.html", {
-        "nested_rates": nested_rates,
-        "factor": ["base_rate"]
-    })   
-
-def copay(request):
-    nested_rates = get_rates_from_db("copay")
-    print(nested_rates)
-    return render(request, "base/rates/copay.html", {
-        "nested_rates": nested_rates,
-        "factor": ["copay"]
-    })
-
-def postcode(request):
-    nested_rates = get_rates_from_db("postcode")
-
-    first_pet = next(iter(nested_rates))
-    first_scheme = next(iter(nested_rates[first_pet]))
-    pc_area = list(nested_rates[first_pet][first_scheme]['postcode'].keys())
-    pc_area.sort()
-
-    return render(request, "base/rates/postcode.html", {
-        "nested_rates": nested_rates,
-        "pc_area": pc_area
-    })
-
-def breed(request):
-    dog_nested = get_rates_from_db("dog_breed")
-    cat_nested = get_rates_from_db("cat_breed")
-    
-    first_pet_dog = next(iter(dog_nested))
-    first_scheme_dog = next(iter(dog_nested[first_pet_dog]))
-    dog_breed_list = list(dog_nested[first_pet_dog][first_scheme_dog]['dog_breed'].keys())
-    dog_breed_list.sort()
-
-    first_pet_cat = next(iter(cat_nested))
-    first_scheme_cat = next(iter(cat_nested[first_pet_cat]))
-    cat_breed_list = list(cat_nested[first_pet_cat][first_scheme_cat]['cat_breed'].keys())
-    cat_breed_list.sort()
-
-    return render(request, "base/rates/breed.html", {
-        'dog_nested_rates': dog_nested,
-        'dog_breeds': dog_breed_list,
-        'cat_nested_rates': cat_nested,
-        'cat_breeds': cat_breed_list,
-    })
-
-def multipet(request):
-    nested_rates = get_rates_from_db("multipet")
-    return render(request, "base/rates/multipet.html", {
-        "nested_rates": nested_rates,
-        "factor": ["multipet"]
-    })
-
-def chipped(request):
-    nested_rates = get_rates_from_db("chipped")
-
-    return render(request, "base/rates/chipped.html", {
-        "nested_rates": nested_rates,
-        "factor": ["chipped"]
-    })
-
-def ph_age(request):
-    nested_rates = get_rates_from_db("ph_age")
-
-    first_pet = next(iter(nested_rates))
-    first_scheme = next(iter(nested_rates[first_pet]))
-    age_bandings = list(nested_rates[first_pet][first_scheme]['ph_age'].keys())
-    age_bandings.sort(key=lambda x: ph_age_order.index(x) if x in ph_age_order else float('inf'))
-
-    return render(request, "base/rates/ph_age.html", {
-        "nested_rates": nested_rates,
-        "age_bandings": age_bandings
-    })
-
-def pet_age(request):
-    nested_rates = get_rates_from_db("pet_age")
-
-    first_pet = next(iter(nested_rates))
-    first_scheme = next(iter(nested_rates[first_pet]))
-    pet_age_bandings = list(nested_rates[first_pet][first_scheme]['pet_age'].keys())
-    pet_age_bandings.sort(key=lambda x: pet_age_order.index(x) if x in pet_age_order else float('inf'))
-
-    return render(request, "base/rates/pet_age.html", {
-        "nested_rates": nested_rates,
-        "pet_age_bandings": pet_age_bandings
-    })
-
-def pet_price(request):
-    nested_rates = get_rates_from_db("pet_price")
-
-    first_pet = next(iter(nested_rates))
-    first_scheme = next(iter(nested_rates[first_pet]))
-    price_bands = list(nested_rates[first_pet][first_scheme]['pet_price'].keys())
-    price_bands.sort(key=lambda x: pet_price_order.index(x) if x in pet_price_order else float('inf'))
-
-    return render(request, "base/rates/pet_price.html", {
-        "nested_rates": nested_rates,
-        "price_bands": price_bands
-    })
-
-def neutered(request):
-    nested_rates = get_rates_from_db("neutered_gender")
-
-    first_pet = next(iter(nested_rates))
-    first_scheme = next(iter(nested_rates[first_pet]))
-    neutered = list(nested_rates[first_pet][first_scheme]['neutered_gender'].keys())
-    neutered.sort()
-    
-    return render(request, "base/rates/neutered.html", {
-        "nested_rates": nested_rates,
-        "neutered": neutered
-    })
-
-def pet_age_gender(request):
-    nested_rates = get_rates_from_db("pet_age_gender")
-
-    first_pet = next(iter(nested_rates))
-    first_scheme = next(iter(nested_rates[first_pet]))
-    pet_age_gender_group = list(nested_rates[first_pet][first_scheme]['pet_age_gender'].keys())
-    order = ['Female: 1-50', 'Female: 51-100', 'Female: 101+', 'Male: 1-50', 'Male: 51-100', 'Male: 101+']
-    pet_age_gender_group.sort(key=lambda x: order.index(x) if x in order else float('inf'))
-
-    return render(request, "base/rates/pet_age_gender.html", {
-        "nested_rates": nested_rates,
-        "pet_age_gender_group": pet_age_gender_group
-    })
-
-def vaccinations(request):
-    nested_rates = get_rates_from_db("vaccinations")
-    return render(request, "base/rates/vaccinations.html", {
-        "nested_rates": nested_rates
-    })
+# Factor pages (rates/<page>/): page -> {factor: grid context name}
+FACTOR_PAGES = {
+    "base_rates": {"base_rate": "grid"},
+    "copay": {"copay": "grid"},
+    "postcode": {"postcode": "grid"},
+    "breed": {"dog_breed": "dog_grid", "cat_breed": "cat_grid"},
+    "multipet": {"multipet": "grid"},
+    "chipped": {"chipped": "grid"},
+    "ph_age": {"ph_age": "grid"},
+    "pet_age": {"pet_age": "grid"},
+    "pet_price": {"pet_price": "grid"},
+    "neutered": {"neutered_gender": "grid"},
+    "pet_age_gender": {"pet_age_gender": "grid"},
+    "vaccinations": {"vaccinations": "grid"},
+    "pre_existing": {"pre_existing": "grid"},
+    "aggressive": {"aggressive": "grid"},
+    "is_pet_yours": {"is_pet_yours": "grid"},
+    "uk_resident": {"uk_resident": "grid"},
+    "kept_at_address": {"kept_at_address": "grid"},
+    "trade_business": {"trade_business": "grid"},
+}
 
-def pre_existing(request):
-    nested_rates = get_rates_from_db("pre_existing")
-    print(nested_rates)
-    return render(request, "base/rates/pre_existing.html", {
-        "nested_rates": nested_rates
-    })
 
-def aggressive(request):
-    nested_rates = get_rates_from_db("aggressive")
-    return render(request, "base/rates/aggressive.html", {
-        "nested_rates": nested_rates
-    })
-
-def is_pet_yours(request):
-    nested_rates = get_rates_from_db("is_pet_yours")
-    return render(request, "base/rates/is_pet_yours.html", {
-        "nested_rates": nested_rates
-    })
+@require_GET
+def factor_grid(request, page):
+    """
+    One rating factor page, from the cached factor grids (no query per view).
+    ?format=json returns the grids (columns, options, rates) instead of the HTML table.
+    """
+    grids = {factor: get_factor_grid(factor) for factor in FACTOR_PAGES[page]}
 
-def uk_resident(request):
-    nested_rates = get_rates_from_db("uk_resident")
-    return render(request, "base/rates/uk_resident.html", {
-        "nested_rates": nested_rates
-    })
+    if request.GET.get("format") == "json":
+        return JsonResponse({
+            factor: {key: grid[key] for key in ("columns", "options", "rates")}
+            for factor, grid in grids.items()
+        })
 
-def kept_at_address(request):
-    nested_rates = get_rates_from_db("kept_at_address")
-    return render(request, "base/rates/kept_at_address.html", {
-        "nested_rates": nested_rates
-    })
+    # Templates loop over the grids' pre-flattened rows and cache the rendered
+    # table per grid version, so a repeat view only re-renders the page shell
+    context = {name: grids[factor] for factor, name in FACTOR_PAGES[page].items()}
 
-def trade_business(request):
-    nested_rates = get_rates_from_db("trade_business")
-    return render(request, "base/rates/trade_business.html", {
-        "nested_rates": nested_rates
-    })
+    return render(request, f"base/rates/{page}.html", context)
 
 def prem_calc(request):
-    # Distinct pet types
-    pet_types = PetRates.objects.values_list('pet_type', flat=True).distinct()
-
-    # Distinct schemes / cover levels
-    cover_levels = PetRates.objects.values_list('scheme', flat=True).distinct()
-
-    pet_age_options = list(PetRates.objects.filter(factor='pet_age').values_list('option', flat=True).distinct())
-    pet_age_options.sort(key=lambda x: pet_age_order.index(x) if x in pet_age_order else float('inf'))
-
-    pet_price_options = list(PetRates.objects.filter(factor='pet_price').values_list('option', flat=True).distinct())
-    pet_price_options.sort(key=lambda x: pet_price_order.index(x) if x in pet_price_order else float('inf'))
-
-    ph_age_options = list(PetRates.objects.filter(factor='ph_age').values_list('option', flat=True).distinct())
-    ph_age_options.sort(key=lambda x: ph_age_order.index(x) if x in ph_age_order else float('inf'))
-
-    dog_breeds = list(PetRates.objects.filter(factor='dog_breed').values_list('option', flat=True).distinct())
-    cat_breeds = list(PetRates.objects.filter(factor='cat_breed').values_list('option', flat=True).distinct())
-
-    postcodes = list(PetRates.objects.filter(factor='postcode').values_list('option', flat=True).distinct())
-
-
-
-    context = {
-        "pet_types": pet_types,
-        "cover_levels": cover_levels,
-        "pet_age_options": pet_age_options,
-        "pet_price_options": pet_price_options,
-        "ph_age_options": ph_age_options,
-        "dog_breeds": dog_breeds,
-        "cat_breeds": cat_breeds,
-        "postcodes": postcodes
-    }
+    # Every dropdown from one pass over the compiled rate table (cached until the rates change)
+    context = dict(get_option_lists())
 
     return render(request, "base/rates/prem_calc.html", context)
 
@@ -347,24 +157,15 @@ def get_pet_rates(request):
     if not pet_type or not cover_level:
         return JsonResponse({"error": "Missing parameters"}, status=400)
 
-    rates = PetRates.objects.filter(
-        pet_type__iexact=pet_type,
-        scheme__iexact=cover_level,
-    )
+    # Compiled in-memory table - no DB query per request
+    scheme_rates = get_scheme_rates(pet_type, cover_level)
 
-    if not rates:
+    if not scheme_rates:
         print("No matching base_rate found.")
         return JsonResponse({"error": "No matching base rate found"}, status=404)
 
-    limit = rates.first().limit
-
-    all_factors = {}
-
-    for r in rates:
-        if r.option:
-            all_factors.setdefault(r.factor, {})[r.option] = r.rate
-        else:
-            all_factors[r.factor] = r.rate
+    limit = scheme_rates["limit"]
+    all_factors = scheme_rates["factors"]
 
     base_rate = all_factors.get("base_rate", 0)
     pet_age_gender_rate = all_factors["pet_age_gender"].get(pet_age_gender, 1)
@@ -380,15 +181,66 @@ def get_pet_rates(request):
     })
 
 
-def re_rated_policies(request):
-    # Load cached data (no DB queries)
-    static_data.load_re_rated_cache()
-    df_merged = static_data.RE_RATED_CACHE
+@require_GET
+def quote(request):
+    """
+    Full premium for one risk: every premium calculator field in, premium,
+    per-factor breakdown and decline flag out. One round trip per form change.
+    """
+    pet_type = request.GET.get("pet_type")
+    cover_level = request.GET.get("cover_level")
+
+    if not pet_type or not cover_level:
+        return JsonResponse({"error": "Missing parameters"}, status=400)
+
+    result = quote_premium(pet_type, cover_level, risk_options(request.GET))
+
+    if result is None:
+        return JsonResponse({"error": "No matching base rate found"}, status=404)
+
+    return JsonResponse(result)
+
+
+@csrf_exempt
+@require_POST
+def quote_batch(request):
+    """
+    Price a list of risks in one call.
+    Accepts a JSON list of risks (or {"risks": [...]}) or a CSV body / uploaded
+    "file", with the same fields as rates/quote/. Returns JSON, or CSV with ?format=csv.
+    """
+    try:
+        if "file" in request.FILES:
+            risks = pd.read_csv(request.FILES["file"], dtype=str, keep_default_na=False)
+        elif request.content_type == "text/csv":
+            risks = pd.read_csv(io.BytesIO(request.body), dtype=str, keep_default_na=False)
+        else:
+            payload = json.loads(request.body or b"[]")
+            risks = pd.DataFrame(payload.get("risks", []) if isinstance(payload, dict) else payload)
+    except (ValueError, pd.errors.ParserError) as e:
+        return JsonResponse({"error": f"Could not read risks: {e}"}, status=400)
+
+    if risks.empty:
+        return JsonResponse({"error": "No risks supplied"}, status=400)
+
+    if not {"pet_type", "cover_level"}.issubset(risks.columns):
+        return JsonResponse({"error": "Missing parameters"}, status=400)
+
+    quotes = price_risks(risks)
 
-    # Filter Policy Records
-    df_merged = df_merged[df_merged["decline_flag"] == "N"]
-    df_merged = df_merged[df_merged["transaction_name"] == "New Business"]
+    if request.GET.get("format") == "csv":
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="quotes.csv"'
+        quotes.to_csv(response, index=False)
+        return response
 
+    return HttpResponse(
+        f'{{"count": {len(quotes)}, "quotes": {quotes.to_json(orient="records")}}}',
+        content_type="application/json",
+    )
+
+
+def re_rated_policies(request):
     # Initialize defaults
     copay = None
     asat_date = None
@@ -406,41 +258,80 @@ def re_rated_policies(request):
                 asat_date = None
 
             print(f"Co-pay: {copay}, As At Date: {asat_date}")
-
-            if asat_date is not None:
-                df_merged["inception_month"] = df_merged["inception_month"].astype(float)
-                df_merged = df_merged[df_merged["inception_month"] <= asat_date]
-
-            # Filter by Co-pay only if not '*'
-            if copay is not None and "copay" in df_merged.columns:
-                if copay != '*':
-                    df_merged = df_merged[df_merged["copay"] == copay]
     else:
         form = UserForms()
 
-    # ---- Group and sum GWP fields by inception_month ----
-    df_sum = (
-        df_merged.groupby("inception_month", as_index=False)[["gwp_per_pet", "re_rated_gwp_per_pet"]]
-        .sum()
-        .rename(columns={"gwp_per_pet": "gwp", "re_rated_gwp_per_pet": "re_rated_gwp"})
-        .sort_values("inception_month")
-
-    )
-    df_sum["rate_index"] = div0(df_sum["re_rated_gwp"], df_sum["gwp"])
-    df_sum["rate_change"] = df_sum["rate_index"].pct_change()
+    # ---- GWP and re-rated GWP by inception_month, filtered in the parquet read ----
+    df_sum = monthly_summary(asat_date=asat_date, copay=copay)
 
     # Convert for template rendering
     sum_pols = df_sum.to_dict(orient="records")
-    policies = df_merged.to_dict(orient="records")
 
     print(sum_pols)
 
     return render(
         request,
         "base/rates/re_rated_policies.html",
-        {"policies": policies, "sum_pols": sum_pols, "form": form}
+        {"sum_pols": sum_pols, "form": form}
+    )
+
+
+@require_GET
+def re_rated_policies_detail(request):
+    """
+    Paginated row-level detail behind the re-rated summary, as JSON.
+    Accepts page, page_size (max 1000), asat_date, copay, scheme and pettype.
+    """
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+        page_size = min(max(int(request.GET.get("page_size", 100)), 1), 1000)
+        asat_date = request.GET.get("asat_date")
+        asat_date = float(asat_date) if asat_date else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid parameters"}, status=400)
+
+    rows, count = policy_detail(
+        page, page_size,
+        asat_date=asat_date,
+        copay=request.GET.get("copay"),
+        scheme=request.GET.get("scheme"),
+        pettype=request.GET.get("pettype"),
     )
 
+    return HttpResponse(
+        f'{{"count": {count}, "page": {page}, "page_size": {page_size}, '
+        f'"policies": {rows.to_json(orient="records", date_format="iso")}}}',
+        content_type="application/json",
+    )
+
+@require_GET
+def re_rated_policies_export(request):
+    """
+    Stream the re-rated rows behind the summary as a download.
+    Accepts format (csv or parquet, default csv), columns (comma separated,
+    default all), asat_date, copay, scheme and pettype.
+    """
+    fmt = request.GET.get("format", "csv")
+    columns = [col.strip() for col in request.GET.get("columns", "").split(",") if col.strip()]
+    try:
+        asat_date = request.GET.get("asat_date")
+        asat_date = float(asat_date) if asat_date else None
+        chunks = export_re_rated(
+            fmt, columns,
+            asat_date=asat_date,
+            copay=request.GET.get("copay"),
+            scheme=request.GET.get("scheme"),
+            pettype=request.GET.get("pettype"),
+        )
+    except FileNotFoundError as e:
+        return JsonResponse({"error": str(e)}, status=404)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="re_rated_policies.{fmt}"'
+    return response
+
 def test(request):
 
     return render(request, "base/rates/test.html")
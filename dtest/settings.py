@@ -108,6 +108,10 @@ DATABASES = {
 
 DATABASE_ROUTERS = ['base.db_router.RatesRouter']
 
+# Binary rate snapshot written by all_rates() (base/static_data/rates_snapshot.bin).
+# When set, rates are loaded from it instead of the rates database.
+RATE_SNAPSHOT = env('RATE_SNAPSHOT', default=None)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
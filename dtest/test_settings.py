@@ -0,0 +1,26 @@
+"""
+Settings for the test suite: SQLite stands in for the MSSQL policy database,
+so the tests run without a SQL Server connection.
+
+    python manage.py test base --settings=dtest.test_settings
+"""
+
+import os
+
+# The MSSQL connection settings are not used, but settings.py reads them
+for name in ("SECRET_KEY", "DB_NAME", "DB_USER", "DB_PASSWORD", "DB_HOST"):
+    os.environ.setdefault(name, "")
+
+from .settings import *  # noqa: E402,F401,F403
+
+# The test database is in memory, so nothing is written to disk
+DATABASES["default"] = {
+    "ENGINE": "django.db.backends.sqlite3",
+    "NAME": ":memory:",
+}
+
+# Always price from the rates database in tests
+RATE_SNAPSHOT = None
+
+# The rates tests do not need the policy database set up first
+DATABASES["rates"]["TEST"] = {"DEPENDENCIES": []}